@@ -0,0 +1,105 @@
+import time
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+import ai_recommendation_system as recommender
+
+# Recall@k against queries per second for the approximate neighbour index
+# (IVFIndex over truncated-SVD embeddings, scoring candidates by embedding or
+# re-ranking them by exact cosine) at several probe counts, measured against the
+# exact sparse compute_cosine_similarity path. Synthetic users belong
+# to one of `groups` taste groups and draw most of their ratings from their
+# group's items, the low-rank structure real ratings have; the rest are uniform.
+# Ground truth is exact cosine over the full ratings for a sample of query users.
+
+def synthetic_ratings(num_users, num_items, ratings_per_user, groups, in_group_fraction, seed):
+    rng = np.random.default_rng(seed)
+    group_items = max(ratings_per_user, num_items // groups)
+    user_groups = rng.integers(0, groups, num_users)
+    user_ids = np.repeat(np.arange(1, num_users + 1), ratings_per_user)
+    # Popularity within a group is skewed, so neighbours share more than chance
+    in_group = (user_groups.repeat(ratings_per_user) * group_items
+                + np.minimum(rng.zipf(1.3, len(user_ids)) - 1, group_items - 1)) % num_items
+    anywhere = rng.integers(0, num_items, len(user_ids))
+    item_ids = np.where(rng.random(len(user_ids)) < in_group_fraction, in_group, anywhere) + 1
+    ratings = rng.integers(1, 6, len(user_ids))
+    return pd.DataFrame({'user_id': user_ids, 'item_id': item_ids, 'rating': ratings})
+
+def recall(approximate, exact):
+    hits = total = 0
+    for found, expected in zip(approximate, exact):
+        expected = set(expected[expected >= 0].tolist())
+        total += len(expected)
+        hits += len(expected & set(found[found >= 0].tolist()))
+    return hits / max(total, 1)
+
+def timed(message, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    print(f'{message}: {time.perf_counter() - start:.1f}s', flush=True)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Approximate neighbour index recall/QPS benchmark')
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=500, help='taste groups users are drawn from')
+    parser.add_argument('--in-group-fraction', type=float, default=0.8)
+    parser.add_argument('--dimensions', type=int, default=recommender.EMBEDDING_DIMENSIONS)
+    parser.add_argument('--lists', type=int, default=recommender.IVF_LISTS, help='0 picks about sqrt(users)')
+    parser.add_argument('--probes', default='1,2,4,8,16,32', help='comma separated probe counts')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000, help='sampled query users')
+    parser.add_argument('--all-neighbours', action='store_true',
+                        help='also time building every user\'s neighbour list at each probe count')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    df = timed('generate ratings', synthetic_ratings, args.users, args.items, args.ratings_per_user, args.groups,
+               args.in_group_fraction, args.seed)
+    user_item_matrix = timed('build CSR matrix', recommender.create_user_item_matrix, df)
+    del df
+    timed('normalize rows', user_item_matrix.normalized)
+    queries = np.random.default_rng(args.seed).choice(user_item_matrix.shape[0], args.queries, replace=False)
+
+    start = time.perf_counter()
+    exact = np.vstack([recommender.compute_cosine_similarity(user_item_matrix, args.k, rows=[row])[0]
+                       for row in queries])
+    exact_qps = len(queries) / (time.perf_counter() - start)
+    embeddings = timed(f'truncated SVD to {args.dimensions} dimensions', recommender.compute_embeddings,
+                       user_item_matrix, args.dimensions, args.seed)
+    normalized, _ = user_item_matrix.normalized()
+    index = timed('train and fill IVF index', recommender.IVFIndex, embeddings, args.lists, seed=args.seed,
+                  exact_rows=normalized)
+
+    print(f"\n{len(index.centroids)} lists, recall@{args.k} over {len(queries)} queries")
+    print(f"{'search':>22} {'recall':>8} {'QPS':>10} {'speedup':>8}"
+          + (f" {'all users (s)':>14}" if args.all_neighbours else ''))
+    print(f"{'exact':>22} {1.0:>8.3f} {exact_qps:>10.1f} {1.0:>8.1f}")
+    exact_rows = index.exact_rows
+    for rerank in (False, True):
+        # Without re-ranking the same index scores candidates by their embeddings
+        index.exact_rows = exact_rows if rerank else None
+        for probes in [int(value) for value in args.probes.split(',')]:
+            start = time.perf_counter()
+            found = np.full((len(queries), args.k), -1)
+            for position, row in enumerate(queries):
+                ids, _ = index.search(embeddings[row], args.k, probes, exclude=row,
+                                      exact_query=normalized[row] if rerank else None)
+                found[position, :len(ids)] = ids
+            qps = len(queries) / (time.perf_counter() - start)
+            name = f"ivf{'+rerank' if rerank else ''} probes={probes}"
+            line = f'{name:>22} {recall(found, exact):>8.3f} {qps:>10.1f} {qps / exact_qps:>8.1f}'
+            if args.all_neighbours:
+                start = time.perf_counter()
+                index.all_neighbours(args.k, probes)
+                line += f' {time.perf_counter() - start:>14.1f}'
+            print(line, flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import time
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+import ai_recommendation_system as recommender
+
+# Per-request latency of POST /recommend at increasing user counts: the original
+# handler, which recomputes a dense pivot and the full users x users similarity on
+# every call, against serving from the model built once by build_model() (sparse
+# ratings, top-k neighbour lists), and the batch path's latency per call for
+# batch_size users at once. Ratings are synthetic, `ratings_per_user` items per user.
+
+def synthetic_ratings(num_users, num_items, ratings_per_user, seed):
+    rng = np.random.default_rng(seed)
+    user_ids = np.repeat(np.arange(1, num_users + 1), ratings_per_user)
+    # Offsets within a user are distinct, so no (user, item) pair repeats
+    offsets = np.tile(np.arange(ratings_per_user), num_users) * (num_items // ratings_per_user)
+    item_ids = (rng.integers(0, num_items, num_users).repeat(ratings_per_user) + offsets) % num_items + 1
+    ratings = rng.integers(1, 6, len(user_ids))
+    return pd.DataFrame({'user_id': user_ids, 'item_id': item_ids, 'rating': ratings})
+
+def recompute_per_request(df, user_id):
+    # The original handler: dense pivot, dense similarity, mean over the top 5 users
+    user_item_matrix = df.pivot(index='user_id', columns='item_id', values='rating').fillna(0)
+    similar = np.argsort(-cosine_similarity(user_item_matrix.values)[user_id - 1], kind='stable')[1:6]
+    return user_item_matrix.iloc[similar].mean().sort_values(ascending=False).index[:5].tolist()
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def measure(call, user_ids):
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        call(user_id)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommendation latency benchmark')
+    parser.add_argument('--users', default='100,1000,5000,20000', help='comma separated user counts')
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per measurement')
+    parser.add_argument('--recompute-requests', type=int, default=20,
+                        help='requests for the recompute-per-request baseline')
+    parser.add_argument('--recompute-max-users', type=int, default=5000,
+                        help='largest user count the baseline runs at, as its similarity matrix is users x users')
+    parser.add_argument('--batch-size', type=int, default=1000, help='users per /recommend/batch call')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'users':>8} {'path':>12} {'build (s)':>10} {'model (MB)':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for num_users in [int(value) for value in args.users.split(',')]:
+        df = synthetic_ratings(num_users, args.items, args.ratings_per_user, args.seed)
+        if num_users <= args.recompute_max_users:
+            latencies = measure(lambda user_id: recompute_per_request(df, user_id),
+                                rng.integers(1, num_users + 1, args.recompute_requests))
+            print(f'{num_users:>8} {"recompute":>12} {"":>10} {"":>10} {percentile(latencies, 0.5) * 1000:>10.2f} '
+                  f'{percentile(latencies, 0.99) * 1000:>10.2f}')
+        start = time.perf_counter()
+        model = recommender.build_model(df)
+        build_seconds = time.perf_counter() - start
+        ratings = model.user_item_matrix.ratings
+        model_bytes = (ratings.data.nbytes + ratings.indices.nbytes + ratings.indptr.nbytes
+                       + model.neighbours.nbytes + model.similarities.nbytes)
+        latencies = measure(model.recommend, rng.integers(1, num_users + 1, args.requests))
+        print(f'{num_users:>8} {"precomputed":>12} {build_seconds:>10.2f} {model_bytes / 2 ** 20:>10.1f} {percentile(latencies, 0.5) * 1000:>10.2f} '
+              f'{percentile(latencies, 0.99) * 1000:>10.2f}')
+        batch_calls = max(1, args.requests // args.batch_size)
+        latencies = measure(model.recommend_batch,
+                            [rng.integers(1, num_users + 1, args.batch_size) for _ in range(batch_calls)])
+        print(f'{num_users:>8} {f"batch x{args.batch_size}":>12} {"":>10} {"":>10} '
+              f'{percentile(latencies, 0.5) * 1000:>10.2f} {percentile(latencies, 0.99) * 1000:>10.2f}')
+
+if __name__ == '__main__':
+    main()
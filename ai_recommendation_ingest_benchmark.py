@@ -0,0 +1,70 @@
+import time
+import argparse
+import logging
+import tempfile
+
+import numpy as np
+
+import ai_recommendation_system as recommender
+from ai_recommendation_ann_benchmark import synthetic_ratings
+
+# Time from POST /ratings to a rating being reflected in recommendations, without
+# the RATING_APPLY_SECONDS wait: logging a batch to a RatingStore, then
+# ModelStore.apply_pending() updating the matrix and neighbour lists incrementally.
+# Compared with a full rebuild of the model, and followed by one compaction of the
+# log and the model. Ratings come from existing and new users on existing and new
+# items; the synthetic data is the taste-group model of ai_recommendation_ann_benchmark.
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental rating ingestion benchmark')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=500)
+    parser.add_argument('--batch-sizes', default='1,100,1000', help='comma separated ratings per apply')
+    parser.add_argument('--batches', type=int, default=20, help='applies per batch size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(args.seed)
+
+    df = synthetic_ratings(args.users, args.items, args.ratings_per_user, args.groups, 0.8, args.seed)
+    store = recommender.RatingStore(tempfile.mkdtemp(), seed=df)
+    del df
+    model_store = recommender.ModelStore(lambda: recommender.build_model(store.load(), 'exact'), store)
+    start = time.perf_counter()
+    model_store.rebuild()
+    rebuild_seconds = time.perf_counter() - start
+    model_store.model.user_item_matrix.normalized()
+    print(f'full rebuild: {rebuild_seconds:.2f}s for {args.users} users')
+
+    print(f"{'batch':>6} {'p50 (ms)':>10} {'p99 (ms)':>10} {'ratings/s':>10}")
+    for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+        latencies = []
+        for _ in range(args.batches):
+            # Mostly existing users and items, with a few new ones of each
+            user_ids = rng.integers(1, int(args.users * 1.01) + 1, batch_size)
+            item_ids = rng.integers(1, int(args.items * 1.01) + 1, batch_size)
+            ratings = rng.integers(1, 6, batch_size).astype(np.float32)
+            start = time.perf_counter()
+            store.append(user_ids, item_ids, ratings)
+            model_store.submit(user_ids, item_ids, ratings)
+            model_store.apply_pending()
+            latencies.append(time.perf_counter() - start)
+            # The rated item is now known to the model and never recommended back
+            model = model_store.model
+            assert item_ids[-1] not in model.recommend(int(user_ids[-1]))
+        latencies.sort()
+        print(f'{batch_size:>6} {percentile(latencies, 0.5) * 1000:>10.1f} {percentile(latencies, 0.99) * 1000:>10.1f} '
+              f'{batch_size * len(latencies) / sum(latencies):>10.0f}')
+
+    changed = len(model_store.model.user_item_matrix.stale_rows)
+    start = time.perf_counter()
+    model_store.compact()
+    print(f'compaction of {changed} changed users: {time.perf_counter() - start:.2f}s')
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
+import os
+import time
+import shutil
+import logging
+import threading
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.model_selection import train_test_split
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import StandardScaler, normalize
+from sklearn.decomposition import TruncatedSVD
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import json
@@ -11,59 +17,654 @@ import json
 app = Flask(__name__)
 CORS(app)
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between scheduled model rebuilds; 0 only builds at startup
+MODEL_REFRESH_SECONDS = float(os.environ.get('MODEL_REFRESH_SECONDS', 300))
+# Neighbours kept per user, and users per block of the similarity computation
+NUM_NEIGHBOURS = int(os.environ.get('NUM_NEIGHBOURS', 20))
+SIMILARITY_BLOCK_ROWS = int(os.environ.get('SIMILARITY_BLOCK_ROWS', 1024))
+NUM_RECOMMENDATIONS = 5
+MAX_BATCH_USERS = int(os.environ.get('MAX_BATCH_USERS', 10000))
+# Neighbour search, 'exact' or 'ivf'; IVF is only used from IVF_MIN_USERS users
+NEIGHBOUR_INDEX = os.environ.get('NEIGHBOUR_INDEX', 'exact')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', 64))
+IVF_MIN_USERS = int(os.environ.get('IVF_MIN_USERS', 100000))
+IVF_LISTS = int(os.environ.get('IVF_LISTS', 0))
+IVF_PROBES = int(os.environ.get('IVF_PROBES', 2))
+IVF_ITERATIONS = 10
+IVF_TRAINING_VECTORS_PER_LIST = 64
+# Rating ingestion: log directory, apply interval and compaction triggers
+RATINGS_DIR = os.environ.get('RATINGS_DIR', 'ratings')
+RATING_APPLY_SECONDS = float(os.environ.get('RATING_APPLY_SECONDS', 1))
+COMPACTION_SECONDS = float(os.environ.get('COMPACTION_SECONDS', 60))
+COMPACTION_MAX_CHANGED_USERS = int(os.environ.get('COMPACTION_MAX_CHANGED_USERS', 10000))
+MAX_RATINGS_PER_REQUEST = int(os.environ.get('MAX_RATINGS_PER_REQUEST', 10000))
+RATING_SCALE = (1, 5)
+RATING_COLUMNS = (('user_id', np.int64), ('item_id', np.int64), ('rating', np.float32))
+
+# Example dataset, the initial contents of an empty rating store
+EXAMPLE_RATINGS = {
+    'user_id': [1, 1, 2, 2, 3, 3, 4, 4, 5],
+    'item_id': [1, 2, 2, 3, 1, 3, 1, 4, 5],
+    'rating': [5, 4, 3, 5, 2, 4, 4, 5, 5]
+}
+
 # Load dataset
 def load_data():
-    # Example dataset
-    data = {
-        'user_id': [1, 1, 2, 2, 3, 3, 4, 4, 5],
-        'item_id': [1, 2, 2, 3, 1, 3, 1, 4, 5],
-        'rating': [5, 4, 3, 5, 2, 4, 4, 5, 5]
-    }
-    df = pd.DataFrame(data)
+    df = open_rating_store().load()
     return df
 
+class RatingStore:
+    # Append-only ratings, one raw memmapped file per column; CURRENT names the live generation
+    def __init__(self, directory=RATINGS_DIR, seed=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, 'CURRENT')) as file:
+                self.generation = int(file.read())
+        except FileNotFoundError:
+            os.makedirs(self._path(0), exist_ok=True)
+            if seed is not None:
+                seed = pd.DataFrame(seed)
+                self._write(0, 'base', [seed[name].to_numpy() for name, _ in RATING_COLUMNS])
+            self._switch(0)
+
+    def _path(self, generation, part=None, column=None):
+        directory = os.path.join(self.directory, f'{generation:06d}')
+        return directory if part is None else os.path.join(directory, f'{part}.{column}')
+
+    def _switch(self, generation):
+        current = os.path.join(self.directory, 'CURRENT')
+        with open(current + '.tmp', 'w') as file:
+            file.write(str(generation))
+        os.replace(current + '.tmp', current)
+        self.generation = generation
+
+    def _write(self, generation, part, columns, mode='wb'):
+        for (name, dtype), values in zip(RATING_COLUMNS, columns):
+            with open(self._path(generation, part, name), mode) as file:
+                file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    def _count(self, generation, part):
+        # Complete entries; an append cut short by a crash leaves columns of different lengths
+        sizes = []
+        for name, dtype in RATING_COLUMNS:
+            path = self._path(generation, part, name)
+            sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def _truncate(self, generation, part):
+        # Cuts every column back to the complete entries, so the next append lines up
+        count = self._count(generation, part)
+        for name, dtype in RATING_COLUMNS:
+            path = self._path(generation, part, name)
+            if os.path.exists(path) and os.path.getsize(path) > count * np.dtype(dtype).itemsize:
+                os.truncate(path, count * np.dtype(dtype).itemsize)
+
+    def _read(self, generation, part, start=0):
+        paths = [self._path(generation, part, name) for name, _ in RATING_COLUMNS]
+        count = self._count(generation, part)
+        return [np.memmap(path, dtype=dtype, mode='r', offset=start * np.dtype(dtype).itemsize,
+                          shape=(count - start,)) if count > start else np.zeros(0, dtype=dtype)
+                for path, (_, dtype) in zip(paths, RATING_COLUMNS)]
+
+    def append(self, user_ids, item_ids, ratings):
+        with self.lock:
+            self._truncate(self.generation, 'delta')
+            self._write(self.generation, 'delta', (user_ids, item_ids, ratings), mode='ab')
+
+    def delta_size(self):
+        with self.lock:
+            return len(self._read(self.generation, 'delta')[0])
+
+    def read(self):
+        with self.lock:
+            base = self._read(self.generation, 'base')
+            delta = self._read(self.generation, 'delta')
+        return [np.concatenate(pair) for pair in zip(base, delta)]
+
+    def load(self):
+        return pd.DataFrame(dict(zip([name for name, _ in RATING_COLUMNS], self.read())))
+
+    def compact(self):
+        # Ratings appended meanwhile move to the new generation's delta
+        with self.lock:
+            generation = self.generation
+            base = self._read(generation, 'base')
+            delta = self._read(generation, 'delta')
+        merged = len(delta[0])
+        columns = [name for name, _ in RATING_COLUMNS]
+        frame = pd.DataFrame({name: np.concatenate(pair) for name, pair in zip(columns, zip(base, delta))})
+        frame = frame.drop_duplicates(['user_id', 'item_id'], keep='last').sort_values(['user_id', 'item_id'])
+        os.makedirs(self._path(generation + 1), exist_ok=True)
+        self._write(generation + 1, 'base', [frame[name].to_numpy() for name in columns])
+        with self.lock:
+            self._write(generation + 1, 'delta', self._read(generation, 'delta', start=merged))
+            self._switch(generation + 1)
+        shutil.rmtree(self._path(generation), ignore_errors=True)
+        logger.info(f"Compacted {merged} new ratings into {len(frame)} ratings on disk.")
+        return merged
+
+def lookup(sorted_ids, order, ids):
+    # Position of each id in an id array, given the array sorted and its sorting order; -1 if absent
+    ids = np.asarray(ids)
+    if not len(sorted_ids):
+        return np.full(len(ids), -1)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, order[positions], -1)
+
+def resize_csr(matrix, shape):
+    # The same entries in a larger matrix, sharing data and indices
+    indptr = np.concatenate((matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1],
+                                                    dtype=matrix.indptr.dtype)))
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+def replace_rows(matrix, rows, replacement):
+    # `matrix` with rows[i] replaced by row i of `replacement`, in O(nnz)
+    keep = np.ones(matrix.shape[0], dtype=bool)
+    keep[rows] = False
+    kept = np.flatnonzero(keep)
+    select = sparse.csr_matrix((np.ones(len(kept), matrix.dtype), (kept, kept)), shape=(matrix.shape[0],) * 2)
+    scatter = sparse.csr_matrix((np.ones(len(rows), matrix.dtype), (rows, np.arange(len(rows)))),
+                                shape=(matrix.shape[0], len(rows)))
+    return (select @ matrix + scatter @ replacement).tocsr()
+
+class UserItemMatrix:
+    # Sparse CSR ratings with the user and item ids of its rows and columns
+    def __init__(self, ratings, user_ids, item_ids, normalized=None, stale_rows=None, orders=(None, None)):
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.shape = ratings.shape
+        user_order, item_order = orders
+        self._user_order = np.argsort(user_ids, kind='stable') if user_order is None else user_order
+        self._item_order = np.argsort(item_ids, kind='stable') if item_order is None else item_order
+        self._sorted_user_ids = user_ids[self._user_order]
+        self._sorted_item_ids = item_ids[self._item_order]
+        self._normalized = normalized
+        # Rows changed since the transposed matrix was built; it still holds their old ratings
+        self.stale_rows = np.zeros(0, dtype=np.int64) if stale_rows is None else stale_rows
+
+    def normalized(self):
+        if self._normalized is None:
+            normalized = normalize(self.ratings, norm='l2').astype(np.float32)
+            self._normalized = normalized, normalized.T.tocsr()
+        return self._normalized
+
+    def row_of(self, user_id):
+        row = self.rows_of([user_id])[0]
+        return int(row) if row >= 0 else None
+
+    def rows_of(self, user_ids):
+        return lookup(self._sorted_user_ids, self._user_order, user_ids)
+
+    def columns_of(self, item_ids):
+        return lookup(self._sorted_item_ids, self._item_order, item_ids)
+
+    def with_ratings(self, user_ids, item_ids, ratings):
+        # New ids are appended, so existing rows and columns keep their positions
+        user_ids, item_ids = np.asarray(user_ids), np.asarray(item_ids)
+        new_users = np.unique(user_ids[self.rows_of(user_ids) < 0])
+        new_items = np.unique(item_ids[self.columns_of(item_ids) < 0])
+        all_user_ids = np.concatenate((self.user_ids, new_users))
+        all_item_ids = np.concatenate((self.item_ids, new_items))
+        user_order = np.argsort(all_user_ids, kind='stable') if len(new_users) else self._user_order
+        item_order = np.argsort(all_item_ids, kind='stable') if len(new_items) else self._item_order
+        rows = lookup(all_user_ids[user_order], user_order, user_ids)
+        columns = lookup(all_item_ids[item_order], item_order, item_ids)
+        shape = (len(all_user_ids), len(all_item_ids))
+
+        ratings_matrix = resize_csr(self.ratings, shape)
+        changed = np.unique(rows)
+        current = ratings_matrix[changed].tocoo()
+        entries = pd.DataFrame({
+            'row': np.concatenate((current.row, np.searchsorted(changed, rows))),
+            'column': np.concatenate((current.col, columns)),
+            'rating': np.concatenate((current.data, np.asarray(ratings, dtype=np.float32))),
+        }).drop_duplicates(['row', 'column'], keep='last')
+        replacement = sparse.csr_matrix((entries['rating'].to_numpy(), (entries['row'], entries['column'])),
+                                        shape=(len(changed), shape[1]))
+        normalized, transposed = self.normalized()
+        normalized = replace_rows(resize_csr(normalized, shape), changed,
+                                  normalize(replacement, norm='l2').astype(np.float32))
+        transposed = resize_csr(transposed, (shape[1], shape[0]))
+        return UserItemMatrix(replace_rows(ratings_matrix, changed, replacement), all_user_ids, all_item_ids,
+                              (normalized, transposed), np.union1d(self.stale_rows, changed),
+                              (user_order, item_order))
+
+    def compacted(self):
+        matrix = UserItemMatrix(self.ratings, self.user_ids, self.item_ids,
+                                orders=(self._user_order, self._item_order))
+        matrix.normalized()
+        return matrix
+
+def top_k_per_row(rows, columns, values, num_rows, k):
+    # Values must be positive, so their float32 bits sort like the values
+    values = np.asarray(values, dtype=np.float32)
+    order = np.argsort((rows.astype(np.int64) << 32) | (~values.view(np.uint32)).astype(np.int64))
+    rows, columns, values = rows[order], columns[order], values[order]
+    counts = np.bincount(rows, minlength=num_rows)
+    rank = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    top = rank < k
+    top_columns = np.full((num_rows, k), -1, dtype=np.int32)
+    top_values = np.zeros((num_rows, k), dtype=np.float32)
+    top_columns[rows[top], rank[top]] = columns[top]
+    top_values[rows[top], rank[top]] = values[top]
+    return top_columns, top_values
+
 # Create a user-item matrix
 def create_user_item_matrix(df):
-    user_item_matrix = df.pivot(index='user_id', columns='item_id', values='rating').fillna(0)
-    return user_item_matrix
+    # A repeated (user, item) pair keeps its last rating
+    df = df.drop_duplicates(['user_id', 'item_id'], keep='last')
+    user_ids, rows = np.unique(df['user_id'].to_numpy(), return_inverse=True)
+    item_ids, columns = np.unique(df['item_id'].to_numpy(), return_inverse=True)
+    ratings = sparse.csr_matrix((df['rating'].to_numpy(dtype=np.float32), (rows, columns)),
+                                shape=(len(user_ids), len(item_ids)))
+    return UserItemMatrix(ratings, user_ids, item_ids)
 
 # Compute cosine similarity
-def compute_cosine_similarity(user_item_matrix):
-    cosine_sim = cosine_similarity(user_item_matrix)
-    return cosine_sim
+def similarity_block(user_item_matrix, rows):
+    # Positive similarities of the given rows as COO arrays (position in rows, user row, similarity)
+    normalized, transposed = user_item_matrix.normalized()
+    queries = normalized[rows]
+    block = (queries @ transposed).tocoo()
+    positions, columns, values = block.row, block.col, block.data
+    stale = user_item_matrix.stale_rows
+    if len(stale):
+        # The transpose has the stale rows' old ratings, so they are scored directly
+        fresh = (queries @ normalized[stale].T).tocoo()
+        current = ~np.isin(columns, stale)
+        positions = np.concatenate((positions[current], fresh.row))
+        columns = np.concatenate((columns[current], stale[fresh.col]))
+        values = np.concatenate((values[current], fresh.data))
+    keep = (columns != rows[positions]) & (values > 0)
+    return positions[keep], columns[keep], values[keep]
+
+def compute_cosine_similarity(user_item_matrix, k=NUM_NEIGHBOURS, block_rows=SIMILARITY_BLOCK_ROWS, rows=None):
+    # Top-k neighbours per user, padded with -1 / 0, computed block_rows users at a time
+    rows = np.arange(user_item_matrix.shape[0]) if rows is None else np.asarray(rows)
+    neighbours = np.full((len(rows), k), -1, dtype=np.int32)
+    similarities = np.zeros((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        neighbours[start:start + block_rows], similarities[start:start + block_rows] = top_k_per_row(
+            *similarity_block(user_item_matrix, block), len(block), k)
+    return neighbours, similarities
+
+def update_neighbours(user_item_matrix, neighbours, similarities, rows):
+    # Exact as long as the given lists were. A full list on which a changed user's
+    # similarity fell is recomputed, since an unlisted user may now belong on it.
+    k = neighbours.shape[1]
+    count = user_item_matrix.shape[0]
+    grown = count - len(neighbours)
+    neighbours = np.concatenate((neighbours, np.full((grown, k), -1, dtype=neighbours.dtype)))
+    similarities = np.concatenate((similarities, np.zeros((grown, k), dtype=similarities.dtype)))
+    positions, columns, values = similarity_block(user_item_matrix, rows)
+    neighbours[rows], similarities[rows] = top_k_per_row(positions, columns, values, len(rows), k)
+
+    changed = np.zeros(count, dtype=bool)
+    changed[rows] = True
+    listed = (neighbours >= 0) & changed[np.maximum(neighbours, 0)]
+    listed[rows] = False
+    listed_at = np.nonzero(listed)
+    # The new similarity of every listed (user, changed user) pair, 0 if none is left
+    pairs = columns.astype(np.int64) * count + rows[positions]
+    order = np.argsort(pairs)
+    at = lookup(pairs[order], order, listed_at[0].astype(np.int64) * count + neighbours[listed_at])
+    now = np.where(at >= 0, values[np.maximum(at, 0)], 0)
+    # The tolerance absorbs float32 rounding between the two directions of a product
+    fell = (now < similarities[listed_at] - 1e-6) & (neighbours[listed_at[0], -1] >= 0)
+    refill = np.unique(listed_at[0][fell])
+    changed[refill] = True
+
+    others = np.union1d(np.flatnonzero(listed.any(axis=1)), columns)
+    others = others[~changed[others]]
+    kept = (neighbours[others] >= 0) & ~listed[others]
+    # A changed user can only enter a full list it was not on by beating its k-th entry
+    was_listed = np.zeros(len(columns), dtype=bool)
+    was_listed[at[at >= 0]] = True
+    found = ~changed[columns] & (was_listed | (values > similarities[columns, -1]) | (neighbours[columns, -1] < 0))
+    top_rows = np.concatenate((np.nonzero(kept)[0], np.searchsorted(others, columns[found])))
+    top_columns = np.concatenate((neighbours[others][kept], rows[positions[found]]))
+    top_values = np.concatenate((similarities[others][kept], values[found]))
+    neighbours[others], similarities[others] = top_k_per_row(top_rows, top_columns, top_values, len(others), k)
+    if len(refill):
+        neighbours[refill], similarities[refill] = compute_cosine_similarity(user_item_matrix, k, rows=refill)
+    return neighbours, similarities
+
+def compute_embeddings(user_item_matrix, dimensions=EMBEDDING_DIMENSIONS, seed=0):
+    # Unit-length truncated-SVD embeddings whose dot products approximate cosine similarity
+    normalized, _ = user_item_matrix.normalized()
+    dimensions = min(dimensions, normalized.shape[1] - 1)
+    if dimensions < 1:
+        raise ValueError('Embeddings need ratings of at least two items')
+    svd = TruncatedSVD(n_components=dimensions, algorithm='randomized', random_state=seed)
+    return normalize(svd.fit_transform(normalized)).astype(np.float32)
+
+class IVFIndex:
+    # Inverted-file index over unit vectors; with exact_rows, candidates are re-ranked by exact cosine
+    def __init__(self, vectors, num_lists=IVF_LISTS, probes=IVF_PROBES, iterations=IVF_ITERATIONS, seed=0,
+                 exact_rows=None):
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        num_lists = min(count, num_lists or max(1, int(np.sqrt(count))))
+        self.probes = probes
+        training = vectors[rng.choice(count, min(count, num_lists * IVF_TRAINING_VECTORS_PER_LIST), replace=False)]
+        centroids = training[rng.choice(len(training), num_lists, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(training @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, training)
+            empty = ~sums.any(axis=1)
+            sums[empty] = training[rng.choice(len(training), empty.sum())]  # reseed empty cells
+            centroids = normalize(sums).astype(np.float32)
+        self.centroids = centroids
+        labels = self.assign(vectors)
+        # Vectors stored cell by cell; cell c holds positions offsets[c]:offsets[c + 1]
+        self.ids = np.argsort(labels, kind='stable').astype(np.int32)
+        self.vectors = vectors[self.ids]
+        self.exact_rows = exact_rows[self.ids] if exact_rows is not None else None
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=num_lists))))
+
+    def assign(self, vectors, chunk_rows=65536):
+        return np.concatenate([np.argmax(vectors[start:start + chunk_rows] @ self.centroids.T, axis=1)
+                               for start in range(0, len(vectors), chunk_rows)] or [np.zeros(0, dtype=int)])
+
+    def _candidates(self, cells):
+        positions = np.concatenate([np.arange(self.offsets[cell], self.offsets[cell + 1]) for cell in cells])
+        return positions
+
+    def _nearest_cells(self, vector, probes):
+        scores = self.centroids @ vector
+        probes = min(probes or self.probes, len(scores))
+        cells = np.argpartition(-scores, probes - 1)[:probes]
+        return cells[np.argsort(-scores[cells])]
+
+    def _scores(self, queries, positions, exact_queries):
+        if self.exact_rows is None or exact_queries is None:
+            return queries @ self.vectors[positions].T
+        return (exact_queries @ self.exact_rows[positions].T).toarray()
+
+    def search(self, vector, k, probes=None, exclude=None, exact_query=None):
+        positions = self._candidates(self._nearest_cells(vector, probes))
+        scores = self._scores(vector[None], positions, exact_query)[0]
+        if exclude is not None:
+            scores[self.ids[positions] == exclude] = -np.inf
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return self.ids[positions[top]], scores[top]
+
+    def all_neighbours(self, k, probes=None):
+        # Members of a cell share the candidates of the cells nearest its centroid
+        neighbours = np.full((len(self.ids), k), -1, dtype=np.int32)
+        similarities = np.zeros((len(self.ids), k), dtype=np.float32)
+        for cell in range(len(self.centroids)):
+            start, stop = self.offsets[cell], self.offsets[cell + 1]
+            if start == stop:
+                continue
+            cells = self._nearest_cells(self.centroids[cell], probes)
+            # The cell itself goes first, so its members score themselves on the diagonal
+            positions = self._candidates(np.concatenate(([cell], cells[cells != cell])))
+            exact_members = self.exact_rows[start:stop] if self.exact_rows is not None else None
+            scores = self._scores(self.vectors[start:stop], positions, exact_members)
+            np.fill_diagonal(scores, -np.inf)
+            top_k = min(k, scores.shape[1] - 1)
+            if top_k < 1:
+                continue
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            members = self.ids[start:stop]
+            neighbours[members, :top_k] = np.where(top_scores > 0, self.ids[positions[top]], -1)
+            similarities[members, :top_k] = np.maximum(top_scores, 0)
+        return neighbours, similarities
 
 # Get recommendations based on user similarity
-def get_recommendations(user_id, user_item_matrix, cosine_sim):
-    user_idx = user_id - 1  # Assuming user_ids start from 1
-    similar_users = list(enumerate(cosine_sim[user_idx]))
-    similar_users = sorted(similar_users, key=lambda x: x[1], reverse=True)[1:6]  # Top 5 similar users
-    similar_user_indices = [i[0] for i in similar_users]
-    
-    user_item_matrix_t = user_item_matrix.T
-    recommended_items = pd.Series()
-    
-    for idx in similar_user_indices:
-        recommended_items = recommended_items.append(user_item_matrix_t.iloc[:, idx])
-    
-    recommended_items = recommended_items.groupby(recommended_items.index).mean().sort_values(ascending=False)
-    return recommended_items.index[:5].tolist()  # Return top 5 item IDs
+def get_recommendations(user_id, user_item_matrix, neighbours, similarities, n=NUM_RECOMMENDATIONS):
+    # Raises KeyError for a user without ratings
+    user_idx = user_item_matrix.row_of(user_id)
+    if user_idx is None:
+        raise KeyError(user_id)
+    valid = neighbours[user_idx] >= 0
+    ratings = user_item_matrix.ratings
+    scores = ratings[neighbours[user_idx][valid]].T @ similarities[user_idx][valid]
+    scores[ratings.indices[ratings.indptr[user_idx]:ratings.indptr[user_idx + 1]]] = 0  # already rated
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > n:
+        candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+    top_items = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return user_item_matrix.item_ids[top_items].tolist()
+
+def get_batch_recommendations(user_ids, user_item_matrix, neighbours, similarities, n=NUM_RECOMMENDATIONS):
+    # {user_id: items}, leaving out users without ratings
+    rows = user_item_matrix.rows_of(user_ids)
+    known = rows >= 0
+    user_ids, rows = np.asarray(user_ids)[known], rows[known]
+    batch_neighbours = neighbours[rows]
+    valid = batch_neighbours >= 0
+    weights = sparse.csr_matrix(
+        (similarities[rows][valid], (np.nonzero(valid)[0], batch_neighbours[valid])),
+        shape=(len(rows), user_item_matrix.shape[0]))
+    ratings = user_item_matrix.ratings
+    scores = weights @ ratings
+    scores = (scores - scores.multiply(ratings[rows] > 0)).tocoo()  # zero out already rated items
+    keep = scores.data > 0
+    top_items, _ = top_k_per_row(scores.row[keep], scores.col[keep], scores.data[keep], len(rows), n)
+    return {int(user_id): user_item_matrix.item_ids[items[items >= 0]].tolist()
+            for user_id, items in zip(user_ids, top_items)}
+
+class RecommendationModel:
+    # Never modified after construction
+    def __init__(self, user_item_matrix, neighbours, similarities, index=None, built_at=None):
+        self.user_item_matrix = user_item_matrix
+        self.neighbours = neighbours
+        self.similarities = similarities
+        # The IVF index is not updated by with_ratings(); it only serves full rebuilds
+        self.index = index
+        self.updated_at = time.time()
+        self.built_at = built_at or self.updated_at
+
+    def with_ratings(self, user_ids, item_ids, ratings):
+        matrix = self.user_item_matrix.with_ratings(user_ids, item_ids, ratings)
+        rows = np.unique(matrix.rows_of(user_ids))
+        neighbours, similarities = update_neighbours(matrix, self.neighbours, self.similarities, rows)
+        return RecommendationModel(matrix, neighbours, similarities, self.index, self.built_at)
+
+    def compacted(self):
+        return RecommendationModel(self.user_item_matrix.compacted(), self.neighbours, self.similarities,
+                                   self.index, self.built_at)
+
+    def recommend(self, user_id):
+        return get_recommendations(user_id, self.user_item_matrix, self.neighbours, self.similarities)
+
+    def recommend_batch(self, user_ids):
+        return get_batch_recommendations(user_ids, self.user_item_matrix, self.neighbours, self.similarities)
+
+def build_model(df=None, neighbour_index=NEIGHBOUR_INDEX):
+    if neighbour_index not in ('exact', 'ivf'):
+        raise ValueError(f"Unknown neighbour index '{neighbour_index}', expected 'exact' or 'ivf'")
+    df = load_data() if df is None else df
+    user_item_matrix = create_user_item_matrix(df)
+    users, items = user_item_matrix.shape
+    if neighbour_index == 'ivf' and users >= IVF_MIN_USERS and items > 1:
+        index = IVFIndex(compute_embeddings(user_item_matrix), exact_rows=user_item_matrix.normalized()[0])
+        return RecommendationModel(user_item_matrix, *index.all_neighbours(NUM_NEIGHBOURS), index=index)
+    return RecommendationModel(user_item_matrix, *compute_cosine_similarity(user_item_matrix))
+
+class ModelStore:
+    # Every change publishes a new model with one reference assignment, so requests take no lock
+    def __init__(self, build=build_model, rating_store=None):
+        self.build = build
+        self.rating_store = rating_store
+        self.model = None
+        self.rebuild_lock = threading.Lock()
+        self.pending = []
+        self.pending_lock = threading.Lock()
+
+    def rebuild(self):
+        with self.rebuild_lock:
+            start = time.perf_counter()
+            model = self.build()
+            self.model = model
+        users, items = model.user_item_matrix.shape
+        logger.info(f"Model rebuilt in {time.perf_counter() - start:.2f}s: {users} users, {items} items.")
+        return model
+
+    def start_refresh(self, interval=MODEL_REFRESH_SECONDS):
+        # Rebuilds every `interval` seconds on a daemon thread; a failed rebuild keeps the current model
+        def refresh():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.rebuild()
+                except Exception:
+                    logger.exception("Model rebuild failed, still serving the previous model.")
+
+        if interval > 0:
+            threading.Thread(target=refresh, name='model-refresh', daemon=True).start()
+
+    def submit(self, user_ids, item_ids, ratings):
+        # Applying a rating a rebuild already included changes nothing
+        with self.pending_lock:
+            self.pending.append((user_ids, item_ids, ratings))
+
+    def apply_pending(self):
+        with self.pending_lock:
+            batches, self.pending = self.pending, []
+        if not batches:
+            return 0
+        user_ids, item_ids, ratings = (np.concatenate(column) for column in zip(*batches))
+        with self.rebuild_lock:
+            start = time.perf_counter()
+            self.model = self.model.with_ratings(user_ids, item_ids, ratings)
+        logger.info(f"Applied {len(ratings)} ratings in {time.perf_counter() - start:.2f}s.")
+        return len(ratings)
+
+    def compact(self):
+        if self.rating_store is not None and self.rating_store.delta_size():
+            self.rating_store.compact()
+        with self.rebuild_lock:
+            if len(self.model.user_item_matrix.stale_rows):
+                start = time.perf_counter()
+                self.model = self.model.compacted()
+                logger.info(f"Model compacted in {time.perf_counter() - start:.2f}s.")
+
+    def start_updates(self, interval=RATING_APPLY_SECONDS, compaction_interval=COMPACTION_SECONDS):
+        def update():
+            compacted_at = time.monotonic()
+            while True:
+                time.sleep(interval)
+                try:
+                    self.apply_pending()
+                    changed_users = len(self.model.user_item_matrix.stale_rows)
+                    if (changed_users > COMPACTION_MAX_CHANGED_USERS
+                            or time.monotonic() - compacted_at >= compaction_interval):
+                        compacted_at = time.monotonic()
+                        self.compact()
+                except Exception:
+                    # The ratings are logged, so the next rebuild still picks them up
+                    logger.exception("Applying new ratings failed.")
+
+        threading.Thread(target=update, name='model-updates', daemon=True).start()
+
+def parse_ratings(data):
+    entries = data.get('ratings', [data]) if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('Expected a rating or {"ratings": [...]}')
+    if len(entries) > MAX_RATINGS_PER_REQUEST:
+        raise ValueError(f'At most {MAX_RATINGS_PER_REQUEST} ratings per request')
+    low, high = RATING_SCALE
+    for entry in entries:
+        if not (isinstance(entry, dict) and type(entry.get('user_id')) is int and type(entry.get('item_id')) is int
+                and type(entry.get('rating')) in (int, float) and low <= entry['rating'] <= high):
+            raise ValueError(f'Ratings need integer user_id and item_id and a rating from {low} to {high}')
+    return (np.array([entry['user_id'] for entry in entries], dtype=np.int64),
+            np.array([entry['item_id'] for entry in entries], dtype=np.int64),
+            np.array([entry['rating'] for entry in entries], dtype=np.float32))
+
+model_store = ModelStore()
+startup_lock = threading.RLock()
+
+def open_rating_store(ratings_dir=RATINGS_DIR):
+    # Opened once per process, by start_model_store or by the first load_data() outside the app
+    with startup_lock:
+        if model_store.rating_store is None:
+            model_store.rating_store = RatingStore(ratings_dir, seed=EXAMPLE_RATINGS)
+        return model_store.rating_store
+
+def start_model_store(ratings_dir=RATINGS_DIR):
+    with startup_lock:
+        if model_store.model is None:
+            open_rating_store(ratings_dir)
+            model_store.rebuild()
+            model_store.start_refresh()
+            model_store.start_updates()
+
+@app.before_request
+def ensure_model():
+    # Starts the model store under any WSGI server, on the first request after a fork
+    if model_store.model is None:
+        start_model_store()
 
 @app.route('/recommend', methods=['POST'])
 def recommend():
     data = request.json
     user_id = data['user_id']
     
-    df = load_data()
-    user_item_matrix = create_user_item_matrix(df)
-    cosine_sim = compute_cosine_similarity(user_item_matrix.values)
-    
-    recommendations = get_recommendations(user_id, user_item_matrix, cosine_sim)
+    try:
+        recommendations = model_store.model.recommend(user_id)
+    except KeyError:
+        return jsonify({'message': 'Unknown user'}), 404
     return jsonify({'recommendations': recommendations})
 
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    user_ids = request.json.get('user_ids')
+    if not isinstance(user_ids, list) or not all(type(user_id) is int for user_id in user_ids):
+        return jsonify({'message': 'user_ids must be a list of integers'}), 400
+    if len(user_ids) > MAX_BATCH_USERS:
+        return jsonify({'message': f'At most {MAX_BATCH_USERS} users per batch'}), 400
+    recommendations = model_store.model.recommend_batch(user_ids)
+    unknown = sorted({user_id for user_id in user_ids if user_id not in recommendations})
+    return jsonify({'recommendations': {str(user_id): items for user_id, items in recommendations.items()},
+                    'unknown': unknown})
+
+@app.route('/ratings', methods=['POST'])
+def add_ratings():
+    try:
+        user_ids, item_ids, ratings = parse_ratings(request.json)
+    except ValueError as error:
+        return jsonify({'message': str(error)}), 400
+    # Logged before queueing, so an accepted rating survives a restart
+    model_store.rating_store.append(user_ids, item_ids, ratings)
+    model_store.submit(user_ids, item_ids, ratings)
+    return jsonify({'message': 'Ratings accepted', 'accepted': len(ratings)}), 202
+
+@app.route('/model', methods=['GET'])
+def get_model():
+    model = model_store.model
+    users, items = model.user_item_matrix.shape
+    return jsonify({'users': users, 'items': items, 'built_at': model.built_at, 'updated_at': model.updated_at,
+                    'changed_users': len(model.user_item_matrix.stale_rows)})
+
+@app.route('/model/rebuild', methods=['POST'])
+def rebuild_model():
+    model = model_store.rebuild()
+    return jsonify({'message': 'Model rebuilt', 'built_at': model.built_at})
+
 @app.route('/data', methods=['GET'])
 def get_data():
     df = load_data()
     return df.to_json(orient="records")
 
 if __name__ == '__main__':
+    start_model_store()
     app.run(debug=True)
\ No newline at end of file
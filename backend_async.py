@@ -0,0 +1,277 @@
+import json
+import time
+import asyncio
+import logging
+import contextlib
+import argparse
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend_performance_tuning import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DEFAULT_PAGE_SIZE,
+    STREAM_BATCH_SIZE, USER_COLUMNS, TASK_COLUMNS, User, Task, cache, counters, metrics, metrics_report,
+    parse_page_args, prometheus_metrics, record_failed_query, record_query_time, set_sqlite_pragmas,
+    start_query_timer, summarize_statuses,
+)
+
+# ASGI variant of backend_performance_tuning's routes on an async SQLAlchemy engine.
+# Models, cache, counters and metrics are shared with the Flask app, so responses
+# and /performance_metrics look the same. They live in process memory, so with
+# --workers N each worker only sees its own writes: the others serve cached pages
+# for up to CACHE_TTL_SECONDS and counters for up to COUNTER_REFRESH_SECONDS, and
+# /performance_metrics covers whichever worker answered.
+# Run with `python backend_async.py` or any ASGI server on backend_async:app.
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+def async_database_url(database_url=DATABASE_URL):
+    # sqlite:///x.db -> sqlite+aiosqlite:///x.db; URLs that already name a driver are kept
+    scheme, separator, rest = database_url.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+def create_async_db_engine(database_url=DATABASE_URL):
+    url = async_database_url(database_url)
+    if database_url in ('sqlite://', 'sqlite:///:memory:'):
+        return create_async_engine(url)
+    async_engine = create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                       pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                                       pool_pre_ping=True)
+    if database_url.startswith('sqlite'):
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+async_engine = create_async_db_engine()
+event.listen(async_engine.sync_engine, "before_cursor_execute", start_query_timer)
+event.listen(async_engine.sync_engine, "after_cursor_execute", record_query_time)
+event.listen(async_engine.sync_engine, "handle_error", record_failed_query)
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+class RequestMetricsMiddleware:
+    # Records every request under "<METHOD> <route path>" when the response starts,
+    # matching the Flask app's after_request timing (time to first byte)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            recorded = True
+            route = scope.get('route')
+            metrics.record_request(f"{scope['method']} {route.path if route else 'unmatched'}",
+                                   status, time.perf_counter() - start)
+
+        async def send_timed(message):
+            if message['type'] == 'http.response.start':
+                record(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        except Exception:
+            if not recorded:
+                record(500)
+            raise
+
+async def stream_rows(name, columns, after, limit, ndjson, filters=()):
+    # Async counterpart of backend_performance_tuning.stream_rows
+    async with AsyncSession() as session:
+        query = select(*columns).where(columns[0] > after, *filters).order_by(columns[0])
+        if limit is not None:
+            query = query.limit(limit)
+        result = await session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        if not ndjson:
+            yield f'{{"{name}": ['
+        separator = ''
+        async for partition in result.partitions():
+            batch = [json.dumps(row._asdict()) for row in partition]
+            yield '\n'.join(batch) + '\n' if ndjson else separator + ','.join(batch)
+            separator = ','
+        if not ndjson:
+            yield ']}'
+
+async def list_rows(request, name, columns, filters=(), scope=()):
+    try:
+        after, limit = parse_page_args(request.query_params)
+    except ValueError as error:
+        return JSONResponse({"message": str(error)}, 400)
+
+    if request.query_params.get('format') == 'ndjson':
+        return StreamingResponse(stream_rows(name, columns, after, limit, ndjson=True, filters=filters),
+                                 media_type='application/x-ndjson')
+    if limit is None and 'after' not in request.query_params:
+        return StreamingResponse(stream_rows(name, columns, after, None, ndjson=False, filters=filters),
+                                 media_type='application/json')
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    key = cache.namespaced(name, *scope, after, page_size)
+    page = cache.get(key)
+    if page is None:
+        async with AsyncSession() as session:
+            query = (select(*columns).where(columns[0] > after, *filters)
+                     .order_by(columns[0]).limit(page_size))
+            items = [row._asdict() for row in await session.execute(query)]
+        next_after = items[-1]['id'] if len(items) == page_size else None
+        page = {name: items, "next_after": next_after}
+        cache.set(key, page)
+        logger.info(f"Fetched {len(items)} {name} after id {after}.")
+    return JSONResponse(page)
+
+async def get_users(request):
+    return await list_rows(request, 'users', USER_COLUMNS)
+
+async def create_user(request):
+    data = await request.json()
+    username = data.get('username')
+    email = data.get('email')
+    async with AsyncSession() as session:
+        session.add(User(username=username, email=email))
+        try:
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            logger.error(f"Failed to create user '{username}': Integrity error.")
+            return JSONResponse({"message": "User already exists"}, 409)
+    cache.invalidate_namespace('users')
+    counters.add_users()
+    logger.info(f"User '{username}' created successfully.")
+    return JSONResponse({"message": "User created", "user": {"username": username, "email": email}}, 201)
+
+async def get_tasks(request):
+    return await list_rows(request, 'tasks', TASK_COLUMNS)
+
+async def create_task(request):
+    data = await request.json()
+    title = data.get('title')
+    task = Task(title=title, user_id=data.get('user_id'))
+    async with AsyncSession() as session:
+        session.add(task)
+        try:
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            logger.error(f"Failed to create task '{title}': Integrity error.")
+            return JSONResponse({"message": "Task creation failed"}, 409)
+    cache.invalidate_namespace('tasks')
+    counters.add_task(task.status)
+    logger.info(f"Task '{title}' created successfully.")
+    return JSONResponse({"message": "Task created", "task": {"title": title}}, 201)
+
+async def get_task_summary(request):
+    await asyncio.to_thread(counters.refresh_if_stale)
+    return JSONResponse(summarize_statuses(counters.snapshot()['task_status_counts']))
+
+async def get_user_tasks(request):
+    user_id = request.path_params['user_id']
+    status = request.query_params.get('status')
+    filters = (Task.user_id == user_id,) if status is None else (Task.user_id == user_id, Task.status == status)
+    async with AsyncSession() as session:
+        user = await session.get(User, user_id)
+    if user is None:
+        logger.warning(f"User {user_id} not found.")
+        return JSONResponse({"message": "User not found"}, 404)
+    return await list_rows(request, 'tasks', TASK_COLUMNS, filters, scope=('user', user_id, status))
+
+async def get_user_task_summary(request):
+    user_id = request.path_params['user_id']
+    key = cache.namespaced('tasks', 'summary', user_id)
+    summary = cache.get(key)
+    if summary is None:
+        async with AsyncSession() as session:
+            if await session.get(User, user_id) is None:
+                logger.warning(f"User {user_id} not found.")
+                return JSONResponse({"message": "User not found"}, 404)
+            query = select(Task.status, func.count()).where(Task.user_id == user_id).group_by(Task.status)
+            rows = (await session.execute(query)).all()
+        summary = dict(summarize_statuses(dict(rows)), user_id=user_id)
+        cache.set(key, summary)
+    return JSONResponse(summary)
+
+async def get_task(request):
+    task_id = request.path_params['task_id']
+    key = cache.namespaced('tasks', 'task', task_id)
+    task = cache.get(key)
+    if task is None:
+        async with AsyncSession() as session:
+            row = (await session.execute(select(*TASK_COLUMNS).where(Task.id == task_id))).first()
+        if row is None:
+            logger.warning(f"Task {task_id} not found.")
+            return JSONResponse({"message": "Task not found"}, 404)
+        task = row._asdict()
+        cache.set(key, task)
+    return JSONResponse({"task": task})
+
+async def update_task_status(request):
+    task_id = request.path_params['task_id']
+    status = (await request.json()).get('status')
+    async with AsyncSession() as session:
+        task = await session.get(Task, task_id)
+        if task is None:
+            logger.warning(f"Task {task_id} not found.")
+            return JSONResponse({"message": "Task not found"}, 404)
+        previous_status = task.status
+        task.status = status
+        await session.commit()
+    counters.change_task_status(previous_status, status)
+    cache.invalidate_namespace('tasks')
+    logger.info(f"Task {task_id} status updated to '{status}'.")
+    return JSONResponse({"message": "Task status updated"})
+
+async def performance_metrics(request):
+    # The periodic COUNT reconciliation is synchronous, so it runs off the event loop
+    await asyncio.to_thread(counters.refresh_if_stale)
+    live_counts = counters.snapshot()
+    if request.query_params.get('format') == 'prometheus':
+        return Response(prometheus_metrics(live_counts), media_type='text/plain; version=0.0.4')
+    return JSONResponse(metrics_report(live_counts))
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_engine.dispose()
+
+app = Starlette(
+    routes=[
+        Route('/users', get_users, methods=['GET']),
+        Route('/users', create_user, methods=['POST']),
+        Route('/tasks', get_tasks, methods=['GET']),
+        Route('/tasks', create_task, methods=['POST']),
+        Route('/tasks/summary', get_task_summary, methods=['GET']),
+        Route('/users/{user_id:int}/tasks', get_user_tasks, methods=['GET']),
+        Route('/users/{user_id:int}/tasks/summary', get_user_task_summary, methods=['GET']),
+        Route('/tasks/{task_id:int}', get_task, methods=['GET']),
+        Route('/tasks/{task_id:int}', update_task_status, methods=['PUT']),
+        Route('/performance_metrics', performance_metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(RequestMetricsMiddleware)],
+    lifespan=lifespan,
+)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Serve backend_performance_tuning routes over ASGI')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes sharing the listening socket; each has its own cache, '
+                             'counters and metrics, so other workers serve stale data until they expire')
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+    # Workers re-import the app from its module path, each with its own engine and pool
+    uvicorn.run('backend_async:app', host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level, access_log=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+# Throughput of the Flask server (threaded dev server, one process) against the
+# ASGI variant in backend_async (uvicorn, --workers processes) at increasing
+# numbers of concurrent keep-alive connections. Both serve the same scratch SQLite
+# database seeded before the run. Connections are opened before timing starts;
+# the client runs in this process, so on small machines it competes for CPU.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+async def read_response(reader):
+    # Returns (status, keep_alive) after consuming a Content-Length or chunked body
+    status = int((await reader.readline()).split()[1])
+    length, chunked, keep_alive = None, False, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value
+        elif name == 'connection':
+            keep_alive = value != 'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+class Client:
+    def __init__(self, port, rng, num_users, num_tasks, write_fraction):
+        self.port = port
+        self.rng = rng
+        self.num_users = num_users
+        self.num_tasks = num_tasks
+        self.write_fraction = write_fraction
+        self.streams = None
+        self.latencies = []
+        self.errors = 0
+
+    async def connect(self):
+        self.streams = await asyncio.open_connection('127.0.0.1', self.port)
+
+    def next_request(self):
+        if self.rng.random() < self.write_fraction:
+            body = json.dumps({'status': self.rng.choice(['incomplete', 'complete'])}).encode()
+            return (f'PUT /tasks/{self.rng.randint(1, self.num_tasks)} HTTP/1.1\r\nHost: localhost\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode() + body
+        if self.rng.random() < 0.5:
+            path = f'/tasks/{self.rng.randint(1, self.num_tasks)}'
+        else:
+            path = f'/users?limit=20&after={self.rng.randint(0, self.num_users)}'
+        return f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode()
+
+    async def run(self, deadline):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if self.streams is None:
+                    await self.connect()
+                reader, writer = self.streams
+                writer.write(self.next_request())
+                status, keep_alive = await read_response(reader)
+                if status >= 500:
+                    self.errors += 1
+                if not keep_alive:
+                    writer.close()
+                    self.streams = None
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                self.errors += 1
+                self.streams = None
+                continue
+            self.latencies.append(time.perf_counter() - start)
+        if self.streams is not None:
+            self.streams[1].close()
+
+async def measure(port, concurrency, duration, num_users, num_tasks, write_fraction, seed):
+    clients = [Client(port, random.Random(seed + index), num_users, num_tasks, write_fraction)
+               for index in range(concurrency)]
+    # Open connections in batches so the listen backlog does not overflow before timing
+    for start in range(0, concurrency, 50):
+        await asyncio.gather(*(client.connect() for client in clients[start:start + 50]),
+                             return_exceptions=True)
+    start = time.perf_counter()
+    await asyncio.gather(*(client.run(start + duration) for client in clients))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(value for client in clients for value in client.latencies)
+    return len(latencies) / elapsed, latencies, sum(client.errors for client in clients)
+
+def wait_for_port(port, timeout=30):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+def start_server(kind, port, workers, environment):
+    if kind == 'sync':
+        code = f"import backend_performance_tuning as b; b.app.run(host='127.0.0.1', port={port}, threaded=True)"
+        command = [sys.executable, '-c', code]
+    else:
+        command = [sys.executable, 'backend_async.py', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=HERE, env=environment, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    wait_for_port(port)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async backend throughput benchmark')
+    parser.add_argument('--concurrency', default='100,250,500,1000', help='comma separated connection counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per measurement')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='uvicorn worker processes')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--write-fraction', type=float, default=0.1, help='share of PUT /tasks/<id> requests')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    environment = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async_benchmark.db')}")
+    os.environ['DATABASE_URL'] = environment['DATABASE_URL']
+    import backend_performance_tuning as backend
+    backend.logger.setLevel('WARNING')
+    backend.performance_tuning_query(args.users)
+    backend.bulk_tasks({'title': f'task {i}', 'user_id': i % args.users + 1} for i in range(args.tasks))
+    environment['CACHE_TTL_SECONDS'] = environment.get('CACHE_TTL_SECONDS', '30')
+
+    print(f"{'server':>14} {'connections':>11} {'req/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+    for kind, label in (('sync', 'flask'), ('async', f'asgi x{args.workers}')):
+        process = start_server(kind, args.port, args.workers, environment)
+        try:
+            for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                throughput, latencies, errors = asyncio.run(measure(
+                    args.port, concurrency, args.duration, args.users, args.tasks, args.write_fraction, args.seed))
+                print(f'{label:>14} {concurrency:>11} {throughput:>10.1f} {percentile(latencies, 0.5) * 1000:>9.2f} '
+                      f'{percentile(latencies, 0.99) * 1000:>9.2f} {errors:>7}')
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import time
+import json
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+from collections import defaultdict
+
+# Load generator for backend_performance_tuning. Each worker thread keeps one
+# keep-alive connection and issues a weighted mix of requests; latency
+# percentiles and throughput are reported per route and overall. Run it against
+# the server before and after a change with the same arguments to compare.
+
+DEFAULT_MIX = 'get_users=2,get_tasks=4,create_task=2,update_task=2'
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class LoadWorker(threading.Thread):
+    def __init__(self, base_url, operations, weights, deadline, max_task_id, seed):
+        super().__init__(daemon=True)
+        self.url = urlparse(base_url)
+        self.operations = operations
+        self.weights = weights
+        self.deadline = deadline
+        self.max_task_id = max_task_id
+        self.rng = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def connect(self):
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=30)
+
+    def request(self, connection, operation):
+        if operation == 'get_users':
+            return connection.request('GET', '/users')
+        if operation == 'get_tasks':
+            return connection.request('GET', '/tasks')
+        headers = {'Content-Type': 'application/json'}
+        if operation == 'create_task':
+            body = {'title': f'load test task {self.rng.random()}', 'user_id': 1}
+            return connection.request('POST', '/tasks', json.dumps(body), headers)
+        task_id = self.rng.randint(1, self.max_task_id)
+        body = {'status': self.rng.choice(['incomplete', 'complete'])}
+        return connection.request('PUT', f'/tasks/{task_id}', json.dumps(body), headers)
+
+    def run(self):
+        connection = self.connect()
+        while time.perf_counter() < self.deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                self.request(connection, operation)
+                response = connection.getresponse()
+                response.read()
+                # 404 on updates of not-yet-existing task ids is an expected outcome
+                if response.status >= 500:
+                    self.errors[operation] += 1
+            except (OSError, http.client.HTTPException):
+                self.errors[operation] += 1
+                connection.close()
+                connection = self.connect()
+                continue
+            self.latencies[operation].append(time.perf_counter() - start)
+        connection.close()
+
+def report(name, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    print(f'{name:>12} {len(latencies):>8} {len(latencies) / elapsed:>10.1f} '
+          f'{percentile(latencies, 0.5) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} '
+          f'{(latencies[-1] if latencies else float("nan")) * 1000:>9.2f} {errors:>7}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for backend_performance_tuning')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='comma separated operation=weight pairs')
+    parser.add_argument('--max-task-id', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mix = dict(item.split('=') for item in args.mix.split(','))
+    operations, weights = list(mix), [float(weight) for weight in mix.values()]
+    deadline = time.perf_counter() + args.duration
+    workers = [LoadWorker(args.base_url, operations, weights, deadline, args.max_task_id, args.seed + index)
+               for index in range(args.concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{'route':>12} {'requests':>8} {'req/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'errors':>7}")
+    all_latencies, all_errors = [], 0
+    for operation in operations:
+        latencies = [value for worker in workers for value in worker.latencies[operation]]
+        errors = sum(worker.errors[operation] for worker in workers)
+        all_latencies += latencies
+        all_errors += errors
+        report(operation, latencies, errors, elapsed)
+    report('total', all_latencies, all_errors, elapsed)
+
+if __name__ == "__main__":
+    main()
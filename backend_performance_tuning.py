@@ -1,21 +1,51 @@
+import os
 import time
-import random
 import threading
 import logging
 import json
-from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, Column, Integer, String, Sequence, ForeignKey
-from sqlalchemy.orm import sessionmaker, declarative_base
+from flask import Flask, Response, request, jsonify, g
+from sqlalchemy import create_engine, event, func, Column, Integer, String, Sequence, ForeignKey, Index
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 from sqlalchemy.exc import IntegrityError
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database setup
-DATABASE_URL = 'sqlite:///performance_tuning.db'  # Use your database URL here
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Database setup, configurable through the environment
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///performance_tuning.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 20))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed during a commit; busy_timeout makes writers wait for the lock
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.close()
+
+def create_db_engine(database_url=DATABASE_URL):
+    pool_options = dict(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                        pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+    if not database_url.startswith('sqlite'):
+        return create_engine(database_url, **pool_options)
+
+    in_memory = database_url in ('sqlite://', 'sqlite:///:memory:')
+    if in_memory:
+        # A private in-memory database only exists on one connection, so no pool sizing
+        return create_engine(database_url, connect_args={"check_same_thread": False})
+    db_engine = create_engine(database_url, connect_args={"check_same_thread": False}, **pool_options)
+    event.listen(db_engine, "connect", set_sqlite_pragmas)
+    return db_engine
+
+engine = create_db_engine()
 Base = declarative_base()
 
 # ORM Models
@@ -32,40 +62,547 @@ class Task(Base):
     user_id = Column(Integer, ForeignKey('users.id'))
     status = Column(String(20), default='incomplete')
 
+    # (user_id, id) serves a user's keyset pages in id order; (user_id, status) serves
+    # status-filtered pages and per-user GROUP BY status without touching the table
+    __table_args__ = (Index('ix_tasks_user_id_id', 'user_id', 'id'),
+                      Index('ix_tasks_user_id_status', 'user_id', 'status'))
+
 Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+# create_all skips indexes of tables that already exist, so add any missing ones
+for index in Task.__table__.indexes:
+    index.create(engine, checkfirst=True)
+SessionFactory = sessionmaker(bind=engine)
+# One session per thread; every request releases it in remove_session
+Session = scoped_session(SessionFactory)
+
+# Keyset pagination and streaming for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+USER_COLUMNS = (User.id, User.username, User.email)
+TASK_COLUMNS = (Task.id, Task.title, Task.status)
+
+# Bulk ingestion
+BULK_CHUNK_ROWS = int(os.environ.get('BULK_CHUNK_ROWS', 1000))
+BULK_ON_CONFLICT = ('skip', 'upsert')
+MAX_REPORTED_ERRORS = 100
 
 # Flask app setup
 app = Flask(__name__)
 
+@app.teardown_appcontext
+def remove_session(exception=None):
+    # Runs after every request, including error paths, returning the connection to the pool
+    Session.remove()
+
 # In-memory cache for quick lookups
-cache = {}
-cache_lock = threading.Lock()
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 30))
+CACHE_SHARDS = int(os.environ.get('CACHE_SHARDS', 16))
+
+class _CacheShard:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+class ShardedTTLCache:
+    # Sharded LRU cache with TTLs; bumping a namespace generation invalidates its keys in O(1)
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_TTL_SECONDS, shards=CACHE_SHARDS):
+        self.shards = [_CacheShard(max(1, max_entries // shards)) for _ in range(shards)]
+        self.default_ttl = default_ttl
+        self.generations = defaultdict(int)
+        self.generation_lock = threading.Lock()
+
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def get(self, key, default=None):
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.misses += 1
+                return default
+            if entry[0] <= time.monotonic():
+                del shard.entries[key]
+                shard.expirations += 1
+                shard.misses += 1
+                return default
+            shard.entries.move_to_end(key)
+            shard.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries[key] = (expires_at, value)
+            shard.entries.move_to_end(key)
+            while len(shard.entries) > shard.max_entries:
+                shard.entries.popitem(last=False)
+                shard.evictions += 1
+
+    def delete(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries.pop(key, None)
+
+    def namespaced(self, namespace, *parts):
+        return (namespace, self.generations[namespace]) + parts
+
+    def invalidate_namespace(self, namespace):
+        with self.generation_lock:
+            self.generations[namespace] += 1
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.entries.clear()
+
+    def stats(self):
+        totals = defaultdict(int)
+        for shard in self.shards:
+            with shard.lock:
+                totals['entries'] += len(shard.entries)
+                totals['hits'] += shard.hits
+                totals['misses'] += shard.misses
+                totals['evictions'] += shard.evictions
+                totals['expirations'] += shard.expirations
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_ratio'] = totals['hits'] / lookups if lookups else 0.0
+        totals['max_entries'] = sum(shard.max_entries for shard in self.shards)
+        return dict(totals)
+
+cache = ShardedTTLCache()
+
+# Request and query instrumentation
+HISTOGRAM_SUB_BUCKET_BITS = 5  # 32 linear sub-buckets per power of two, <= ~3% relative error
+HISTOGRAM_MAX_MICROSECONDS = 60_000_000
+COUNTER_REFRESH_SECONDS = float(os.environ.get('COUNTER_REFRESH_SECONDS', 60))
+COMPLETED_TASK_STATUSES = ('complete',)
+
+class LatencyHistogram:
+    # HDR-style histogram in fixed memory; every bucket spans at most 1/2^S of its value
+    def __init__(self, max_value=HISTOGRAM_MAX_MICROSECONDS, sub_bucket_bits=HISTOGRAM_SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value = max_value
+        self.counts = [0] * (self._index(max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def _upper_bound(self, index):
+        sub_buckets = 1 << self.sub_bucket_bits
+        shift = max(0, index // sub_buckets - 1)
+        top = index - (shift << self.sub_bucket_bits)
+        return ((top + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = min(self.max_value, max(0, int(seconds * 1_000_000)))
+        index = self._index(value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        # Highest value equivalent to the bucket holding the requested rank, in seconds
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, int(fraction * self.count + 0.5))
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return min(self._upper_bound(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count / 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p90_ms": self.percentile(0.9) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max / 1000,
+        }
 
-def cache_result(key, value):
-    with cache_lock:
-        cache[key] = value
+class RouteMetrics:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.client_errors = 0
+
+class Metrics:
+    # Per-route request latency and errors, plus DB query latency per statement type
+    def __init__(self):
+        self.routes = defaultdict(RouteMetrics)
+        self.overall = RouteMetrics()
+        self.queries = defaultdict(LatencyHistogram)
+        self.lock = threading.Lock()
+
+    def record_request(self, route, status, seconds):
+        with self.lock:
+            route_metrics = self.routes[route]
+        for target in (route_metrics, self.overall):
+            target.latency.record(seconds)
+            with self.lock:
+                target.requests += 1
+                if status >= 500:
+                    target.errors += 1
+                elif status >= 400:
+                    target.client_errors += 1
+
+    def record_query(self, statement_type, seconds):
+        with self.lock:
+            histogram = self.queries[statement_type]
+        histogram.record(seconds)
+
+metrics = Metrics()
+
+class EntityCounters:
+    # Counts maintained on every write and reconciled at most every COUNTER_REFRESH_SECONDS
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.task_statuses = defaultdict(int)
+        self.refreshed_at = None
+
+    def refresh(self):
+        session = SessionFactory()
+        try:
+            users = session.query(func.count(User.id)).scalar()
+            statuses = dict(session.query(Task.status, func.count(Task.id)).group_by(Task.status).all())
+        finally:
+            session.close()
+        with self.lock:
+            self.users = users
+            self.task_statuses = defaultdict(int, statuses)
+            self.refreshed_at = time.monotonic()
+
+    def refresh_if_stale(self):
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > COUNTER_REFRESH_SECONDS:
+            self.refresh()
+
+    def add_users(self, count=1):
+        with self.lock:
+            self.users += count
+
+    def add_task(self, status):
+        with self.lock:
+            self.task_statuses[status] += 1
+
+    def add_tasks(self, statuses):
+        with self.lock:
+            for status in statuses:
+                self.task_statuses[status] += 1
+
+    def change_task_status(self, old_status, new_status):
+        with self.lock:
+            self.task_statuses[old_status] -= 1
+            self.task_statuses[new_status] += 1
+
+    def snapshot(self):
+        self.refresh_if_stale()
+        with self.lock:
+            statuses = {status: count for status, count in self.task_statuses.items() if count}
+            users = self.users
+        active = sum(count for status, count in statuses.items() if status not in COMPLETED_TASK_STATUSES)
+        return {"total_users": users, "active_tasks": active, "task_status_counts": statuses}
+
+counters = EntityCounters()
+
+def statement_type(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+
+@event.listens_for(engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append((statement, time.perf_counter()))
+
+@event.listens_for(engine, "after_cursor_execute")
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    _, start = conn.info['query_start_times'].pop()
+    metrics.record_query(statement_type(statement), time.perf_counter() - start)
+
+@event.listens_for(engine, "handle_error")
+def record_failed_query(context):
+    # A failed statement never reaches after_cursor_execute, so its start time is popped here.
+    # Errors outside execution (connecting, fetching) have no start time of their own.
+    start_times = context.connection.info.get('query_start_times') if context.connection is not None else None
+    if start_times and start_times[-1][0] == context.statement:
+        _, start = start_times.pop()
+        metrics.record_query(f'{statement_type(context.statement)} (failed)', time.perf_counter() - start)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # For streamed bodies this measures the time to the first byte
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+        metrics.record_request(route, response.status_code, time.perf_counter() - start)
+    return response
+
+def cache_result(key, value, ttl=None):
+    cache.set(key, value, ttl)
 
 def get_cached_result(key):
-    with cache_lock:
-        return cache.get(key)
+    return cache.get(key)
 
-def performance_tuning_query(num_users=1000):
-    logger.info(f"Generating {num_users} users for performance tuning.")
-    session = Session()
-    
-    # Bulk insert operation
-    users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(num_users)]
+def parse_page_args(args):
+    # (after, limit) from query string args; limit is None when the client did not ask for a page
     try:
-        session.bulk_save_objects(users)
-        session.commit()
-        logger.info(f"{num_users} users inserted successfully.")
-    except IntegrityError:
-        session.rollback()
-        logger.error("Integrity error occurred during bulk save.")
+        after = int(args.get('after', 0))
+        limit = args.get('limit')
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        raise ValueError("'after' and 'limit' must be integers")
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return after, limit
+
+def stream_rows(name, columns, after, limit, ndjson, filters=()):
+    # Uses its own session, as the generator outlives the request's scoped session
+    session = SessionFactory()
+    try:
+        query = session.query(*columns).filter(columns[0] > after, *filters).order_by(columns[0])
+        if limit is not None:
+            query = query.limit(limit)
+        if not ndjson:
+            yield f'{{"{name}": ['
+        separator = ''
+        batch = []
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            batch.append(json.dumps(row._asdict()))
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield '\n'.join(batch) + '\n' if ndjson else separator + ','.join(batch)
+                separator = ','
+                batch = []
+        if batch:
+            yield '\n'.join(batch) + '\n' if ndjson else separator + ','.join(batch)
+        if not ndjson:
+            yield ']}'
     finally:
         session.close()
 
+def list_rows(name, columns, filters=(), scope=()):
+    # GET handler for /users, /tasks and /users/<id>/tasks: keyset pages, NDJSON or the whole table
+    try:
+        after, limit = parse_page_args(request.args)
+    except ValueError as error:
+        return jsonify({"message": str(error)}), 400
+
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_rows(name, columns, after, limit, ndjson=True, filters=filters),
+                        mimetype='application/x-ndjson')
+    if limit is None and 'after' not in request.args:
+        return Response(stream_rows(name, columns, after, None, ndjson=False, filters=filters),
+                        mimetype='application/json')
+
+    # Pages read through the cache; writes to the table invalidate its namespace
+    page_size = limit or DEFAULT_PAGE_SIZE
+    key = cache.namespaced(name, *scope, after, page_size)
+    page = cache.get(key)
+    if page is None:
+        session = Session()
+        rows = (session.query(*columns).filter(columns[0] > after, *filters)
+                .order_by(columns[0]).limit(page_size).all())
+        items = [row._asdict() for row in rows]
+        next_after = items[-1]['id'] if len(items) == page_size else None
+        page = {name: items, "next_after": next_after}
+        cache.set(key, page)
+        logger.info(f"Fetched {len(items)} {name} after id {after}.")
+    return jsonify(page), 200
+
+def conflict_insert(table, on_conflict, conflict_columns, update_columns):
+    # Dialects without ON CONFLICT get a plain INSERT; write_rows then skips conflicting rows
+    if on_conflict not in BULK_ON_CONFLICT:
+        raise ValueError(f"'on_conflict' must be one of {', '.join(BULK_ON_CONFLICT)}")
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(engine.dialect.name)
+    if dialect is None:
+        if on_conflict == 'upsert':
+            raise ValueError(f"on_conflict=upsert is not supported on {engine.dialect.name}")
+        return table.insert()
+    statement = dialect.insert(table)
+    if on_conflict == 'skip':
+        return statement.on_conflict_do_nothing()
+    return statement.on_conflict_do_update(index_elements=list(conflict_columns),
+                                           set_={column: statement.excluded[column] for column in update_columns})
+
+def reject_row(result, index, error):
+    result['rejected'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({"index": index, "error": str(error)})
+
+def write_rows(statement, rows, on_conflict, result, inserted=None):
+    # If the batch fails, each row is retried alone so a bad row only rejects itself.
+    # inserted(rows, written) follows every committed write whose written rows are all new
+    try:
+        with engine.begin() as connection:
+            written = connection.execute(statement, [row for _, row in rows]).rowcount
+        written = len(rows) if written < 0 else written  # some drivers do not report executemany rowcounts
+        result['written'] += written
+        result['skipped'] += len(rows) - written
+        if inserted:
+            inserted([row for _, row in rows], written)
+        return
+    except IntegrityError:
+        pass
+    for index, row in rows:
+        try:
+            with engine.begin() as connection:
+                written = connection.execute(statement, row).rowcount
+            result['written'] += written
+            result['skipped'] += 1 - written
+            if inserted:
+                inserted([row], written)
+        except IntegrityError as error:
+            if on_conflict == 'skip':
+                result['skipped'] += 1
+            else:
+                reject_row(result, index, error.orig)
+
+def bulk_insert(table, rows, on_conflict='skip', conflict_columns=(), update_columns=(), validate=None,
+                inserted=None):
+    # BULK_CHUNK_ROWS per transaction, so memory stays bounded for streamed input. Upserts
+    # cannot tell inserted rows from updated ones, so `inserted` only hears of skip writes
+    statement = conflict_insert(table, on_conflict, conflict_columns, update_columns)
+    inserted = inserted if on_conflict == 'skip' else None
+    result = {"received": 0, "written": 0, "skipped": 0, "rejected": 0, "errors": []}
+
+    def flush(chunk):
+        # executemany needs the same keys in every row, e.g. tasks with and without ids
+        groups = defaultdict(list)
+        for index, row in chunk:
+            groups[tuple(sorted(row))].append((index, row))
+        for group in groups.values():
+            write_rows(statement, group, on_conflict, result, inserted)
+
+    chunk = []
+    for index, row in enumerate(rows):
+        result['received'] += 1
+        try:
+            chunk.append((index, validate(row) if validate else row))
+        except ValueError as error:
+            reject_row(result, index, error)
+            continue
+        if len(chunk) == BULK_CHUNK_ROWS:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
+
+def ndjson_rows(stream):
+    # Malformed lines become ValueErrors, rejected like any other invalid row
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield ValueError(f"Invalid JSON: {error}")
+
+def request_rows(name):
+    # Rows of a bulk request: an NDJSON body, a JSON array or {"<name>": [...]}
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return ndjson_rows(request.stream)
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get(name)
+    if not isinstance(data, list):
+        raise ValueError(f'Expected a JSON array, {{"{name}": [...]}} or an NDJSON body')
+    return data
+
+def require_object(row):
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("Row must be a JSON object")
+    return row
+
+def validate_user(row):
+    row = require_object(row)
+    username, email = row.get('username'), row.get('email')
+    if not isinstance(username, str) or not username or not isinstance(email, str) or not email:
+        raise ValueError("'username' and 'email' must be non-empty strings")
+    return {'username': username, 'email': email}
+
+def validate_task(row):
+    row = require_object(row)
+    title, user_id, status = row.get('title'), row.get('user_id'), row.get('status', 'incomplete')
+    if not isinstance(title, str) or not title:
+        raise ValueError("'title' must be a non-empty string")
+    if user_id is not None and not isinstance(user_id, int):
+        raise ValueError("'user_id' must be an integer")
+    if not isinstance(status, str) or not status:
+        raise ValueError("'status' must be a non-empty string")
+    task = {'title': title, 'user_id': user_id, 'status': status}
+    if 'id' in row:
+        if not isinstance(row['id'], int):
+            raise ValueError("'id' must be an integer")
+        task['id'] = row['id']
+    return task
+
+def bulk_users(rows, on_conflict='skip'):
+    # Upserts match on username and update the email. Counters follow skip writes; upserted
+    # users are counted by the next periodic refresh
+    result = bulk_insert(User.__table__, rows, on_conflict, conflict_columns=('username',),
+                         update_columns=('email',), validate=validate_user,
+                         inserted=lambda users, written: counters.add_users(written))
+    if result['written']:
+        cache.invalidate_namespace('users')
+    return result
+
+def count_inserted_tasks(tasks, written):
+    # When only some rows of a batch were new their statuses are unknown; the periodic refresh settles them
+    if written == len(tasks):
+        counters.add_tasks(task['status'] for task in tasks)
+
+def bulk_tasks(rows, on_conflict='skip'):
+    # Conflicts can only occur on explicit ids; upserts replace title, owner and status
+    result = bulk_insert(Task.__table__, rows, on_conflict, conflict_columns=('id',),
+                         update_columns=('title', 'user_id', 'status'), validate=validate_task,
+                         inserted=count_inserted_tasks)
+    if result['written']:
+        cache.invalidate_namespace('tasks')
+    return result
+
+def bulk_endpoint(name, ingest):
+    try:
+        rows = request_rows(name)
+        result = ingest(rows, request.args.get('on_conflict', 'skip'))
+    except ValueError as error:
+        return jsonify({"message": str(error)}), 400
+    logger.info(f"Bulk {name}: {result['written']} written, {result['skipped']} skipped, "
+                f"{result['rejected']} rejected of {result['received']}.")
+    return jsonify(result), 200
+
+def performance_tuning_query(num_users=1000):
+    # Seeds user0..user{num_users - 1}; users left over from an earlier run are skipped
+    logger.info(f"Generating {num_users} users for performance tuning.")
+    users = ({'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(num_users))
+    result = bulk_users(users)
+    logger.info(f"{result['written']} users inserted, {result['skipped']} already existed.")
+    return result
+
 @app.route('/users', methods=['POST'])
 def create_user():
     data = request.get_json()
@@ -78,24 +615,22 @@ def create_user():
 
     try:
         session.commit()
+        cache.invalidate_namespace('users')
+        counters.add_users()
         logger.info(f"User '{username}' created successfully.")
         return jsonify({"message": "User created", "user": {"username": username, "email": email}}), 201
     except IntegrityError:
         session.rollback()
         logger.error(f"Failed to create user '{username}': Integrity error.")
         return jsonify({"message": "User already exists"}), 409
-    finally:
-        session.close()
+
+@app.route('/users/bulk', methods=['POST'])
+def create_users_bulk():
+    return bulk_endpoint('users', bulk_users)
 
 @app.route('/users', methods=['GET'])
 def get_users():
-    session = Session()
-    users = session.query(User).all()
-    user_list = [{"username": user.username, "email": user.email} for user in users]
-    logger.info(f"Fetched {len(user_list)} users.")
-    session.close()
-    
-    return jsonify({"users": user_list}), 200
+    return list_rows('users', USER_COLUMNS)
 
 @app.route('/tasks', methods=['POST'])
 def create_task():
@@ -109,24 +644,73 @@ def create_task():
     session.add(task)
     try:
         session.commit()
+        cache.invalidate_namespace('tasks')
+        counters.add_task(task.status)
         logger.info(f"Task '{title}' created successfully.")
         return jsonify({"message": "Task created", "task": {"title": title}}), 201
     except IntegrityError:
         session.rollback()
         logger.error(f"Failed to create task '{title}': Integrity error.")
         return jsonify({"message": "Task creation failed"}), 409
-    finally:
-        session.close()
+
+@app.route('/tasks/bulk', methods=['POST'])
+def create_tasks_bulk():
+    return bulk_endpoint('tasks', bulk_tasks)
 
 @app.route('/tasks', methods=['GET'])
 def get_tasks():
-    session = Session()
-    tasks = session.query(Task).all()
-    task_list = [{"title": task.title, "status": task.status} for task in tasks]
-    logger.info(f"Fetched {len(task_list)} tasks.")
-    session.close()
-    
-    return jsonify({"tasks": task_list}), 200
+    return list_rows('tasks', TASK_COLUMNS)
+
+def summarize_statuses(status_counts):
+    status_counts = {status: count for status, count in status_counts.items() if count}
+    active = sum(count for status, count in status_counts.items() if status not in COMPLETED_TASK_STATUSES)
+    return {"status_counts": status_counts, "total": sum(status_counts.values()), "active": active}
+
+@app.route('/tasks/summary', methods=['GET'])
+def get_task_summary():
+    # Served from the maintained counters, so polling it never scans the tasks table
+    return jsonify(summarize_statuses(counters.snapshot()['task_status_counts'])), 200
+
+@app.route('/users/<int:user_id>/tasks', methods=['GET'])
+def get_user_tasks(user_id):
+    # Same paging and streaming options as GET /tasks, plus ?status=
+    status = request.args.get('status')
+    filters = (Task.user_id == user_id,) if status is None else (Task.user_id == user_id, Task.status == status)
+    if Session().get(User, user_id) is None:
+        logger.warning(f"User {user_id} not found.")
+        return jsonify({"message": "User not found"}), 404
+    return list_rows('tasks', TASK_COLUMNS, filters, scope=('user', user_id, status))
+
+@app.route('/users/<int:user_id>/tasks/summary', methods=['GET'])
+def get_user_task_summary(user_id):
+    # One GROUP BY over the (user_id, status) index, cached until the next task write
+    key = cache.namespaced('tasks', 'summary', user_id)
+    summary = cache.get(key)
+    if summary is None:
+        session = Session()
+        if session.get(User, user_id) is None:
+            logger.warning(f"User {user_id} not found.")
+            return jsonify({"message": "User not found"}), 404
+        rows = (session.query(Task.status, func.count()).filter(Task.user_id == user_id)
+                .group_by(Task.status).all())
+        summary = dict(summarize_statuses(dict(rows)), user_id=user_id)
+        cache.set(key, summary)
+    return jsonify(summary), 200
+
+@app.route('/tasks/<int:task_id>', methods=['GET'])
+def get_task(task_id):
+    # Keyed by the generation read before the query, so a row raced by a write is never served
+    key = cache.namespaced('tasks', 'task', task_id)
+    task = cache.get(key)
+    if task is None:
+        session = Session()
+        row = session.query(*TASK_COLUMNS).filter(Task.id == task_id).first()
+        if row is None:
+            logger.warning(f"Task {task_id} not found.")
+            return jsonify({"message": "Task not found"}), 404
+        task = row._asdict()
+        cache.set(key, task)
+    return jsonify({"task": task}), 200
 
 @app.route('/tasks/<int:task_id>', methods=['PUT'])
 def update_task_status(task_id):
@@ -140,23 +724,82 @@ def update_task_status(task_id):
         logger.warning(f"Task {task_id} not found.")
         return jsonify({"message": "Task not found"}), 404
 
+    previous_status = task.status
     task.status = status
     session.commit()
+    counters.change_task_status(previous_status, status)
+    cache.invalidate_namespace('tasks')
     logger.info(f"Task {task_id} status updated to '{status}'.")
-    session.close()
 
     return jsonify({"message": "Task status updated"}), 200
 
+def prometheus_metrics(live_counts):
+    lines = []
+
+    def summary(name, help_text, series):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} summary")
+        for labels, histogram in series:
+            for quantile in (0.5, 0.9, 0.99):
+                lines.append(f'{name}{{{labels},quantile="{quantile}"}} {histogram.percentile(quantile):.6f}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total / 1_000_000:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def simple(name, metric_type, help_text, series):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in series:
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+    with metrics.lock:
+        routes = list(metrics.routes.items())
+        queries = list(metrics.queries.items())
+    route_labels = []
+    for route, route_metrics in routes:
+        method, rule = route.split(' ', 1)
+        route_labels.append((f'method="{method}",route="{rule}"', route_metrics))
+    summary('http_request_duration_seconds', 'Request latency by route.',
+            [(labels, route_metrics.latency) for labels, route_metrics in route_labels])
+    simple('http_requests_total', 'counter', 'Requests by route.',
+           [(labels, route_metrics.requests) for labels, route_metrics in route_labels])
+    simple('http_request_errors_total', 'counter', 'Responses with status >= 500 by route.',
+           [(labels, route_metrics.errors) for labels, route_metrics in route_labels])
+    summary('db_query_duration_seconds', 'Database query latency by statement type.',
+            [(f'statement="{statement_type}"', histogram) for statement_type, histogram in queries])
+    simple('app_users', 'gauge', 'Number of users.', [('', live_counts['total_users'])])
+    simple('app_active_tasks', 'gauge', 'Number of tasks not completed.', [('', live_counts['active_tasks'])])
+    simple('app_tasks', 'gauge', 'Number of tasks by status.',
+           [(f'status="{status}"', count) for status, count in live_counts['task_status_counts'].items()])
+    cache_stats = cache.stats()
+    simple('cache_events_total', 'counter', 'Cache events by kind.',
+           [(f'event="{kind}"', cache_stats[kind]) for kind in ('hits', 'misses', 'evictions', 'expirations')])
+    simple('cache_entries', 'gauge', 'Entries currently cached.', [('', cache_stats['entries'])])
+    return '\n'.join(lines) + '\n'
+
+def metrics_report(live_counts):
+    with metrics.lock:
+        routes = list(metrics.routes.items())
+        queries = list(metrics.queries.items())
+    report = dict(live_counts)
+    report.update({
+        "request_latency": metrics.overall.latency.percentile(0.5) * 1000,  # p50 over all routes, ms
+        "requests": metrics.overall.requests,
+        "errors": metrics.overall.errors,
+        "routes": {route: dict(route_metrics.latency.summary(), requests=route_metrics.requests,
+                               errors=route_metrics.errors, client_errors=route_metrics.client_errors)
+                   for route, route_metrics in routes},
+        "db_queries": {statement_type: histogram.summary() for statement_type, histogram in queries},
+        "cache": cache.stats(),
+    })
+    return report
+
 @app.route('/performance_metrics', methods=['GET'])
 def performance_metrics():
-    # Dummy metrics for demonstration
-    metrics = {
-        "total_users": 1000,
-        "active_tasks": 500,
-        "request_latency": random.uniform(20, 100),  # Simulate latency
-    }
+    live_counts = counters.snapshot()
+    if request.args.get('format') == 'prometheus':
+        return Response(prometheus_metrics(live_counts), mimetype='text/plain; version=0.0.4')
     logger.info("Fetched performance metrics.")
-    return jsonify(metrics), 200
+    return jsonify(metrics_report(live_counts)), 200
 
 if __name__ == "__main__":
     performance_tuning_query()  # Pre-load some data for testing
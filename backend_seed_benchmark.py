@@ -0,0 +1,63 @@
+import os
+import time
+import argparse
+import tempfile
+
+# Seeding throughput for backend_performance_tuning: the original ORM
+# bulk_save_objects load against the chunked Core executemany path used by
+# performance_tuning_query and the /users/bulk endpoint. Each method starts from
+# an empty users table in a scratch SQLite database and reports rows/sec.
+
+def user_rows(count):
+    return ({'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(count))
+
+def reset(backend):
+    backend.Base.metadata.drop_all(backend.engine)
+    backend.Base.metadata.create_all(backend.engine)
+
+def seed_orm(backend, rows):
+    session = backend.SessionFactory()
+    try:
+        session.bulk_save_objects([backend.User(**row) for row in user_rows(rows)])
+        session.commit()
+    finally:
+        session.close()
+    return rows
+
+def seed_core(backend, rows):
+    return backend.bulk_users(user_rows(rows))['written']
+
+def run(backend, name, seed, rows):
+    reset(backend)
+    start = time.perf_counter()
+    written = seed(backend, rows)
+    elapsed = time.perf_counter() - start
+    print(f'{name:>24} {written:>10} {elapsed:>9.2f} {written / elapsed:>12.0f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Seeding benchmark for backend_performance_tuning')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--orm-rows', type=int, default=100_000,
+                        help='rows for the ORM baseline, which holds every object in memory (0 to skip)')
+    parser.add_argument('--chunk-rows', type=int, default=None, help='rows per executemany and commit')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    # The backend creates its engine at import time, so point it at the scratch database first
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'seed_benchmark.db')}"
+    import backend_performance_tuning as backend
+    if args.chunk_rows:
+        backend.BULK_CHUNK_ROWS = args.chunk_rows
+
+    print(f"{'method':>24} {'rows':>10} {'time (s)':>9} {'rows/s':>12}")
+    if args.orm_rows:
+        run(backend, 'orm bulk_save_objects', seed_orm, args.orm_rows)
+    run(backend, f'core executemany/{backend.BULK_CHUNK_ROWS}', seed_core, args.rows)
+    # A second pass over the same rows measures the ON CONFLICT DO NOTHING path
+    start = time.perf_counter()
+    result = backend.bulk_users(user_rows(args.rows))
+    elapsed = time.perf_counter() - start
+    print(f"{'core re-seed (skipped)':>24} {result['skipped']:>10} {elapsed:>9.2f} {args.rows / elapsed:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,207 @@
+import os
+import json
 import random
+import hashlib
+import multiprocessing
+from collections import OrderedDict
 import numpy as np
 import matplotlib.pyplot as plt
 
+# Number of set bits for every possible byte value, used to score packed chromosomes
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+# One record per generation in GeneticAlgorithm.history
+GENERATION_STATS_DTYPE = np.dtype([('best', 'f8'), ('mean', 'f8'), ('std', 'f8'), ('diversity', 'f8')])
+
+# Rows unpacked at a time when computing diversity of a packed population
+_DIVERSITY_CHUNK_ROWS = 4096
+
+# Seconds an island worker gets to exit after shutdown before it is terminated
+_WORKER_JOIN_TIMEOUT = 5
+
+class FitnessEvaluator:
+    # Wraps a user fitness function with a bounded LRU cache keyed by a hash of the
+    # packed chromosome. With batched=True the function receives a (n, length) 0/1
+    # uint8 array and returns n scores; otherwise it is called once per chromosome.
+    # Without a function, fitness is the number of ones in the chromosome.
+    def __init__(self, fitness_function=None, batched=False, cache_size=0):
+        self.fitness_function = fitness_function
+        self.batched = batched
+        self.cache_size = cache_size if fitness_function is not None else 0
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(packed):
+        return hashlib.blake2b(packed.tobytes(), digest_size=16).digest()
+
+    def score(self, chromosomes):
+        if self.fitness_function is None:
+            return chromosomes.sum(axis=1, dtype=np.int64)
+        if self.batched:
+            return np.asarray(self.fitness_function(chromosomes), dtype=np.float64)
+        return np.array([self.fitness_function(chromosome) for chromosome in chromosomes], dtype=np.float64)
+
+    def lookup(self, key):
+        value = self.cache.get(key)
+        if value is not None:
+            self.cache.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def evaluate(self, chromosome):
+        if self.fitness_function is None:
+            return sum(chromosome)
+        if not self.cache_size:
+            self.misses += 1
+            return self.score(np.asarray([chromosome], dtype=np.uint8))[0]
+        key = self.cache_key(np.packbits(np.asarray(chromosome, dtype=np.uint8)))
+        value = self.lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = self.score(np.asarray([chromosome], dtype=np.uint8))[0]
+        self.store(key, value)
+        return value
+
+    def evaluate_packed(self, genes, chromosome_length):
+        if self.fitness_function is None:
+            return _POPCOUNT[genes].sum(axis=1, dtype=np.int64)
+        if not self.cache_size:
+            self.misses += len(genes)
+            return self.score(np.unpackbits(genes, axis=1, count=chromosome_length))
+
+        # Only one representative of each uncached chromosome is scored, in one batch
+        fitness = np.empty(len(genes), dtype=np.float64)
+        missing = {}
+        for row, packed in enumerate(genes):
+            key = self.cache_key(packed)
+            value = self.lookup(key)
+            if value is None:
+                missing.setdefault(key, []).append(row)
+            else:
+                fitness[row] = value
+        self.misses += len(missing)
+        self.hits += len(genes) - len(missing)
+        if missing:
+            representatives = [rows[0] for rows in missing.values()]
+            scores = self.score(np.unpackbits(genes[representatives], axis=1, count=chromosome_length))
+            for (key, rows), value in zip(missing.items(), scores):
+                fitness[rows] = value
+                self.store(key, value)
+        return fitness
+
 class Individual:
-    def __init__(self, chromosome_length):
-        self.chromosome = self.generate_chromosome(chromosome_length)
-        self.fitness = self.evaluate_fitness()
+    # Fitness is evaluated lazily on first access and invalidated by mutation, so a
+    # child produced by crossover and then mutated is only scored once
+    def __init__(self, chromosome_length, chromosome=None, evaluator=None):
+        if chromosome is None:
+            chromosome = self.generate_chromosome(chromosome_length)
+        self.chromosome = chromosome
+        self.evaluator = evaluator
+        self._fitness = None
+
+    @property
+    def fitness(self):
+        if self._fitness is None:
+            self._fitness = self.evaluate_fitness()
+        return self._fitness
+
+    @fitness.setter
+    def fitness(self, value):
+        self._fitness = value
+
+    def invalidate_fitness(self):
+        self._fitness = None
 
     def generate_chromosome(self, length):
         return [random.randint(0, 1) for _ in range(length)]
 
     def evaluate_fitness(self):
-        return sum(self.chromosome)
+        if self.evaluator is None:
+            return sum(self.chromosome)
+        return self.evaluator.evaluate(self.chromosome)
+
+class PackedPopulation:
+    # Whole population in one (size, ceil(length / 8)) uint8 matrix, one bit per gene.
+    # Genes are packed MSB-first (np.packbits order); padding bits are always zero.
+    # Fitness is computed for the whole matrix on first access.
+    def __init__(self, genes, chromosome_length, evaluator=None):
+        self.genes = genes
+        self.chromosome_length = chromosome_length
+        self.evaluator = evaluator or FitnessEvaluator()
+        self._fitness = None
+
+    @property
+    def fitness(self):
+        if self._fitness is None:
+            self._fitness = self.evaluate_fitness()
+        return self._fitness
+
+    @fitness.setter
+    def fitness(self, value):
+        self._fitness = value
+
+    @classmethod
+    def random(cls, size, chromosome_length, rng, evaluator=None):
+        num_bytes = (chromosome_length + 7) // 8
+        genes = rng.integers(0, 256, size=(size, num_bytes), dtype=np.uint8)
+        genes[:, -1] &= _tail_mask(chromosome_length)
+        return cls(genes, chromosome_length, evaluator)
+
+    def evaluate_fitness(self):
+        return self.evaluator.evaluate_packed(self.genes, self.chromosome_length)
+
+    def chromosome(self, index):
+        return np.unpackbits(self.genes[index], count=self.chromosome_length).tolist()
+
+    def gene_frequencies(self):
+        # Fraction of ones at every locus, unpacking a bounded number of rows at a time
+        ones = np.zeros(self.chromosome_length, dtype=np.int64)
+        for start in range(0, len(self), _DIVERSITY_CHUNK_ROWS):
+            chunk = self.genes[start:start + _DIVERSITY_CHUNK_ROWS]
+            ones += np.unpackbits(chunk, axis=1, count=self.chromosome_length).sum(axis=0, dtype=np.int64)
+        return ones / max(len(self), 1)
+
+    def __len__(self):
+        return self.genes.shape[0]
+
+def _tail_mask(chromosome_length):
+    # Mask keeping only the used bits of the last byte of a packed chromosome
+    used_bits = chromosome_length % 8 or 8
+    return np.uint8((0xFF << (8 - used_bits)) & 0xFF)
 
 class GeneticAlgorithm:
-    def __init__(self, population_size, chromosome_length, mutation_rate, generations):
+    ENGINES = ('object', 'numpy')
+
+    def __init__(self, population_size, chromosome_length, mutation_rate, generations,
+                 engine='object', seed=None, fitness_function=None, batched_fitness=False, cache_size=0,
+                 checkpoint_path=None, checkpoint_interval=0):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
         self.population_size = population_size
         self.chromosome_length = chromosome_length
         self.mutation_rate = mutation_rate
         self.generations = generations
+        self.engine = engine
+        self.rng = np.random.default_rng(seed)
+        self.evaluator = FitnessEvaluator(fitness_function, batched_fitness, cache_size)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.history = np.zeros(generations, dtype=GENERATION_STATS_DTYPE)
+        self.completed_generations = 0
         self.population = self.initialize_population()
 
     def initialize_population(self):
-        return [Individual(self.chromosome_length) for _ in range(self.population_size)]
+        if self.engine == 'numpy':
+            return PackedPopulation.random(self.population_size, self.chromosome_length, self.rng, self.evaluator)
+        return [Individual(self.chromosome_length, evaluator=self.evaluator) for _ in range(self.population_size)]
 
     def select_parents(self):
         total_fitness = sum(individual.fitness for individual in self.population)
@@ -33,33 +212,313 @@ class GeneticAlgorithm:
         crossover_point = random.randint(1, self.chromosome_length - 1)
         child1_chromosome = parent1.chromosome[:crossover_point] + parent2.chromosome[crossover_point:]
         child2_chromosome = parent2.chromosome[:crossover_point] + parent1.chromosome[crossover_point:]
-        return Individual(self.chromosome_length), Individual(self.chromosome_length)
+        return (Individual(self.chromosome_length, child1_chromosome, self.evaluator),
+                Individual(self.chromosome_length, child2_chromosome, self.evaluator))
 
     def mutate(self, individual):
         for index in range(self.chromosome_length):
             if random.random() < self.mutation_rate:
                 individual.chromosome[index] = 1 - individual.chromosome[index]
-        individual.fitness = individual.evaluate_fitness()
+        individual.invalidate_fitness()
+
+    def select_parents_packed(self, num_pairs):
+        # Roulette selection for every pair at once: one searchsorted over the fitness CDF
+        fitness = self.population.fitness
+        cumulative = np.cumsum(fitness, dtype=np.float64)
+        total_fitness = cumulative[-1]
+        if total_fitness <= 0:
+            indices = self.rng.integers(0, len(self.population), size=2 * num_pairs)
+        else:
+            draws = self.rng.random(2 * num_pairs) * total_fitness
+            indices = np.searchsorted(cumulative, draws, side='right')
+            np.minimum(indices, len(self.population) - 1, out=indices)
+        return indices[0::2], indices[1::2]
+
+    def crossover_packed(self, parents1, parents2):
+        # Single-point crossover on packed bytes: each row gets a byte mask that is
+        # 0xFF before its crossover point, partial on the boundary byte and 0 after it
+        genes = self.population.genes
+        num_pairs, num_bytes = len(parents1), genes.shape[1]
+        points = self.rng.integers(1, self.chromosome_length, size=num_pairs)
+        boundary_byte, boundary_bits = np.divmod(points, 8)
+        byte_index = np.arange(num_bytes)
+        partial = ((0xFF << (8 - boundary_bits)) & 0xFF).astype(np.uint8)
+        mask = np.where(byte_index < boundary_byte[:, None], np.uint8(0xFF), np.uint8(0))
+        mask[np.arange(num_pairs), boundary_byte] = partial
+
+        head1, head2 = genes[parents1], genes[parents2]
+        children = np.empty((2 * num_pairs, num_bytes), dtype=np.uint8)
+        children[0::2] = (head1 & mask) | (head2 & ~mask)
+        children[1::2] = (head2 & mask) | (head1 & ~mask)
+        return children
+
+    def mutate_packed(self, genes):
+        # Flip positions of a Bernoulli(mutation_rate) process over all genes, drawn as
+        # geometric gaps so memory scales with the number of flips rather than genes
+        total_genes = genes.shape[0] * self.chromosome_length
+        if self.mutation_rate <= 0 or total_genes == 0:
+            return
+        expected = total_genes * self.mutation_rate
+        batch = int(expected + 4 * np.sqrt(expected) + 16)
+        positions = np.cumsum(self.rng.geometric(self.mutation_rate, size=batch)) - 1
+        while positions[-1] < total_genes:
+            more = np.cumsum(self.rng.geometric(self.mutation_rate, size=batch)) + positions[-1]
+            positions = np.concatenate([positions, more])
+        positions = positions[positions < total_genes]
+
+        rows, columns = np.divmod(positions, self.chromosome_length)
+        flat_index = rows * genes.shape[1] + columns // 8
+        bits = (np.uint8(0x80) >> (columns % 8).astype(np.uint8)).astype(np.uint8)
+        np.bitwise_xor.at(genes.reshape(-1), flat_index, bits)
+
+    def next_generation_packed(self):
+        parents1, parents2 = self.select_parents_packed(self.population_size // 2)
+        children = self.crossover_packed(parents1, parents2)
+        self.mutate_packed(children)
+        return PackedPopulation(children, self.chromosome_length, self.evaluator)
+
+    def emigrants(self, count):
+        # Copies of the best `count` packed chromosomes and their fitness, for migration
+        best = np.argsort(self.population.fitness)[::-1][:count]
+        return self.population.genes[best].copy(), self.population.fitness[best].copy()
+
+    def immigrate(self, genes, fitness):
+        # Incoming chromosomes replace the worst individuals of this population
+        worst = np.argsort(self.population.fitness)[:len(genes)]
+        self.population.genes[worst] = genes[:len(worst)]
+        self.population.fitness[worst] = fitness[:len(worst)]
 
     def evolve(self):
-        for generation in range(self.generations):
-            new_population = []
-            for _ in range(self.population_size // 2):
-                parent1, parent2 = self.select_parents()
-                child1, child2 = self.crossover(parent1, parent2)
-                self.mutate(child1)
-                self.mutate(child2)
-                new_population.extend([child1, child2])
-            self.population = new_population
+        for _ in self.evolve_iter():
+            pass
+
+    def evolve_iter(self):
+        # Runs the remaining generations, yielding (generation, stats record) after each
+        # one. Continues from completed_generations, so it also resumes a checkpoint.
+        for generation in range(self.completed_generations, self.generations):
+            if self.engine == 'numpy':
+                self.population = self.next_generation_packed()
+            else:
+                new_population = []
+                for _ in range(self.population_size // 2):
+                    parent1, parent2 = self.select_parents()
+                    child1, child2 = self.crossover(parent1, parent2)
+                    self.mutate(child1)
+                    self.mutate(child2)
+                    new_population.extend([child1, child2])
+                self.population = new_population
+            self.history[generation] = self.generation_stats()
+            self.completed_generations = generation + 1
             self.log_generation(generation)
+            if self.checkpoint_path and self.checkpoint_interval and \
+                    self.completed_generations % self.checkpoint_interval == 0:
+                self.save_checkpoint()
+            yield generation, self.history[generation]
+
+    def generation_stats(self):
+        # Diversity is the mean per-locus heterozygosity 2p(1 - p), i.e. the expected
+        # normalized Hamming distance between two random individuals (0 = converged)
+        if self.engine == 'numpy':
+            fitness = self.population.fitness
+            frequencies = self.population.gene_frequencies()
+        else:
+            fitness = np.array([individual.fitness for individual in self.population], dtype=np.float64)
+            frequencies = np.mean([individual.chromosome for individual in self.population], axis=0)
+        diversity = float(np.mean(2 * frequencies * (1 - frequencies)))
+        return fitness.max(), fitness.mean(), fitness.std(), diversity
+
+    def save_checkpoint(self, path=None):
+        # Population, fitness, history and RNG state in one uncompressed .npz, written
+        # to a temporary file and renamed so a crash never leaves a torn checkpoint
+        path = path or self.checkpoint_path
+        if self.engine == 'numpy':
+            genes = self.population.genes
+            fitness = self.population.fitness
+            rng_state = {'numpy': self.rng.bit_generator.state}
+        else:
+            genes = np.packbits(np.array([ind.chromosome for ind in self.population], dtype=np.uint8), axis=1)
+            fitness = np.array([ind.fitness for ind in self.population], dtype=np.float64)
+            legacy_state = np.random.get_state()
+            rng_state = {'random': random.getstate(),
+                         'legacy': [legacy_state[0], legacy_state[1].tolist(), *legacy_state[2:]]}
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as checkpoint_file:
+            np.savez(checkpoint_file, genes=genes, fitness=fitness,
+                     history=self.history[:self.completed_generations],
+                     completed_generations=self.completed_generations,
+                     chromosome_length=self.chromosome_length, engine=self.engine,
+                     rng_state=json.dumps(rng_state))
+        os.replace(temporary_path, path)
+
+    def load_checkpoint(self, path=None):
+        path = path or self.checkpoint_path
+        with np.load(path) as checkpoint:
+            if str(checkpoint['engine']) != self.engine or \
+                    int(checkpoint['chromosome_length']) != self.chromosome_length:
+                raise ValueError(f"Checkpoint '{path}' was written by a different engine or chromosome length")
+            genes = checkpoint['genes']
+            fitness = checkpoint['fitness']
+            completed = int(checkpoint['completed_generations'])
+            self.history[:completed] = checkpoint['history'][:self.generations]
+            rng_state = json.loads(str(checkpoint['rng_state']))
+
+        if self.engine == 'numpy':
+            self.population = PackedPopulation(genes, self.chromosome_length, self.evaluator)
+            self.population.fitness = fitness
+            self.rng.bit_generator.state = rng_state['numpy']
+        else:
+            chromosomes = np.unpackbits(genes, axis=1, count=self.chromosome_length).tolist()
+            self.population = []
+            for chromosome, value in zip(chromosomes, fitness.tolist()):
+                individual = Individual(self.chromosome_length, chromosome, self.evaluator)
+                individual.fitness = value
+                self.population.append(individual)
+            version, internal_state, gauss_next = rng_state['random']
+            random.setstate((version, tuple(internal_state), gauss_next))
+            name, keys, *rest = rng_state['legacy']
+            np.random.set_state((name, np.array(keys, dtype=np.uint32), *rest))
+        self.completed_generations = completed
+
+    def resume(self):
+        # Continue from the last checkpoint if one exists, otherwise start from scratch
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            self.load_checkpoint()
+        self.evolve()
 
     def log_generation(self, generation):
-        best_fitness = max(individual.fitness for individual in self.population)
-        print(f'Generation {generation}: Best Fitness = {best_fitness}')
+        if self.engine == 'numpy':
+            best_fitness = self.population.fitness.max().item()
+        else:
+            best_fitness = max(individual.fitness for individual in self.population)
+        message = f'Generation {generation}: Best Fitness = {best_fitness}'
+        if self.evaluator.cache_size:
+            message += f', Cache Hits = {self.evaluator.hits}, Cache Misses = {self.evaluator.misses}'
+        print(message)
 
     def get_best_individual(self):
+        if self.engine == 'numpy':
+            fitness = self.population.fitness
+            best_index = int(np.argmax(fitness))
+            best = Individual(self.chromosome_length, self.population.chromosome(best_index), self.evaluator)
+            # Already scored with the population, so reading best.fitness does not evaluate it again
+            best.fitness = fitness[best_index].item()
+            return best
         return max(self.population, key=lambda ind: ind.fitness)
 
+def _island_worker(connection, island_seeds, population_size, chromosome_length, mutation_rate,
+                   fitness_options):
+    # Runs a group of islands in one process. Each message from the coordinator is
+    # (generations, migration_size, immigrants per island); None shuts the worker down.
+    islands = [GeneticAlgorithm(population_size, chromosome_length, mutation_rate, 0,
+                                engine='numpy', seed=seed, **fitness_options) for seed in island_seeds]
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        generations, migration_size, immigrants = message
+        for ga, incoming in zip(islands, immigrants):
+            if incoming is not None:
+                ga.immigrate(*incoming)
+            for _ in range(generations):
+                ga.population = ga.next_generation_packed()
+        connection.send([ga.emigrants(migration_size) for ga in islands])
+    connection.close()
+
+class IslandModel:
+    TOPOLOGIES = ('ring', 'fully_connected')
+
+    def __init__(self, num_islands, population_size, chromosome_length, mutation_rate, generations,
+                 migration_interval=10, migration_size=2, topology='ring', processes=None, seed=None,
+                 fitness_function=None, batched_fitness=False, cache_size=0):
+        if topology not in self.TOPOLOGIES:
+            raise ValueError(f"Unknown topology '{topology}', expected one of {self.TOPOLOGIES}")
+        if migration_size < 1:
+            raise ValueError("migration_size must be at least 1")
+        self.num_islands = num_islands
+        self.population_size = population_size
+        self.chromosome_length = chromosome_length
+        self.mutation_rate = mutation_rate
+        self.generations = generations
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+        self.topology = topology
+        self.processes = min(processes or multiprocessing.cpu_count(), num_islands)
+        # One independent seed per island, so results do not depend on the process count
+        self.island_seeds = np.random.SeedSequence(seed).spawn(num_islands)
+        # The fitness function must be picklable (e.g. a module-level function)
+        self.fitness_options = {'fitness_function': fitness_function, 'batched_fitness': batched_fitness,
+                                'cache_size': cache_size}
+        self.best_per_island = [None] * num_islands
+
+    def route_migrants(self, emigrants):
+        # Decide which island receives which migrants according to the topology
+        if self.num_islands < 2:
+            return [None] * self.num_islands
+        if self.topology == 'ring':
+            return [emigrants[(island - 1) % self.num_islands] for island in range(self.num_islands)]
+        routed = []
+        for island in range(self.num_islands):
+            others = [emigrants[source] for source in range(self.num_islands) if source != island]
+            routed.append((np.concatenate([genes for genes, _ in others]),
+                           np.concatenate([fitness for _, fitness in others])))
+        return routed
+
+    def evolve(self):
+        assignments = [list(range(worker, self.num_islands, self.processes)) for worker in range(self.processes)]
+        connections, workers = [], []
+        for islands in assignments:
+            parent_end, child_end = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=_island_worker,
+                args=(child_end, [self.island_seeds[island] for island in islands], self.population_size,
+                      self.chromosome_length, self.mutation_rate, self.fitness_options),
+                daemon=True)
+            worker.start()
+            child_end.close()
+            connections.append(parent_end)
+            workers.append(worker)
+
+        try:
+            immigrants = [None] * self.num_islands
+            completed = 0
+            while completed < self.generations:
+                epoch = min(self.migration_interval, self.generations - completed)
+                for connection, islands in zip(connections, assignments):
+                    connection.send((epoch, self.migration_size, [immigrants[island] for island in islands]))
+                emigrants = [None] * self.num_islands
+                for connection, islands in zip(connections, assignments):
+                    for island, migrants in zip(islands, connection.recv()):
+                        emigrants[island] = migrants
+                completed += epoch
+                self.best_per_island = emigrants
+                self.log_generation(completed - 1)
+                immigrants = self.route_migrants(emigrants)
+        finally:
+            for connection in connections:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass  # the worker has already exited; BrokenPipeError is an OSError
+                connection.close()
+            for worker in workers:
+                # A worker still blocked sending an epoch's results never reads the shutdown message
+                worker.join(_WORKER_JOIN_TIMEOUT)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+    def log_generation(self, generation):
+        best_fitness = [fitness[0].item() for _, fitness in self.best_per_island]
+        print(f'Generation {generation}: Best Fitness per island = {best_fitness}')
+
+    def get_best_individual(self):
+        if None in self.best_per_island:
+            raise ValueError("No generation has completed yet; call evolve() with generations >= 1 first")
+        genes, fitness = max(self.best_per_island, key=lambda migrants: migrants[1][0])
+        best = Individual(self.chromosome_length, np.unpackbits(genes[0], count=self.chromosome_length).tolist())
+        best.fitness = fitness[0].item()
+        return best
+
 def main():
     population_size = 100
     chromosome_length = 20
@@ -75,15 +534,13 @@ def main():
     plot_results(ga)
 
 def plot_results(ga):
-    best_fitness_over_time = []
-
-    for generation in range(ga.generations):
-        best_fitness = max(individual.fitness for individual in ga.population)
-        best_fitness_over_time.append(best_fitness)
+    history = ga.history[:ga.completed_generations]
 
-    plt.plot(best_fitness_over_time)
+    plt.plot(history['best'], label='Best')
+    plt.plot(history['mean'], label='Mean')
+    plt.legend()
     plt.xlabel('Generation')
-    plt.ylabel('Best Fitness')
+    plt.ylabel('Fitness')
     plt.title('GA Optimization Progress')
     plt.show()
 
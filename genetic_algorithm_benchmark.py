@@ -0,0 +1,51 @@
+import time
+import argparse
+import multiprocessing
+import matplotlib.pyplot as plt
+from genetic_algorithm import IslandModel
+
+# Island-model speed-up benchmark: the same set of islands (same seeds, same total
+# work) is evolved with an increasing number of worker processes.
+
+def time_island_model(processes, args):
+    model = IslandModel(args.islands, args.population_size, args.chromosome_length, args.mutation_rate,
+                        args.generations, migration_interval=args.migration_interval,
+                        topology=args.topology, processes=processes, seed=args.seed)
+    start = time.perf_counter()
+    model.evolve()
+    elapsed = time.perf_counter() - start
+    return elapsed, model.get_best_individual().fitness
+
+def main():
+    parser = argparse.ArgumentParser(description='Island-model GA speed-up against core count')
+    parser.add_argument('--islands', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--population-size', type=int, default=20000)
+    parser.add_argument('--chromosome-length', type=int, default=2000)
+    parser.add_argument('--mutation-rate', type=float, default=0.001)
+    parser.add_argument('--generations', type=int, default=50)
+    parser.add_argument('--migration-interval', type=int, default=10)
+    parser.add_argument('--topology', choices=IslandModel.TOPOLOGIES, default='ring')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='island_speedup.png')
+    args = parser.parse_args()
+
+    core_counts = sorted({1, 2, 4, 8, 16, 32, 64, args.islands} & set(range(1, args.islands + 1)))
+    timings = []
+    for processes in core_counts:
+        elapsed, best_fitness = time_island_model(processes, args)
+        timings.append(elapsed)
+        speedup = timings[0] / elapsed
+        print(f'{processes:3d} cores: {elapsed:8.2f}s  speed-up {speedup:5.2f}x  best fitness {best_fitness}')
+
+    speedups = [timings[0] / elapsed for elapsed in timings]
+    plt.plot(core_counts, speedups, marker='o', label='Measured')
+    plt.plot(core_counts, core_counts, linestyle='--', label='Linear')
+    plt.xlabel('Cores')
+    plt.ylabel('Speed-up')
+    plt.title(f'Island-model GA ({args.islands} islands, {args.topology})')
+    plt.legend()
+    plt.savefig(args.output)
+    print(f'Speed-up curve written to {args.output}')
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,1208 @@
+import os
+import json
 import time
+import math
+import heapq
+import bisect
 import random
+import asyncio
+import hashlib
+import itertools
+import operator
+import argparse
 import threading
 import logging
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import deque
 from urllib.parse import urlparse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Proxy settings (seconds / connections / bytes)
+CONNECT_TIMEOUT = 2.0      # waiting for a pooled connection slot plus the TCP connect
+READ_TIMEOUT = 30.0        # longest silence from either peer while a request is in flight
+CLIENT_IDLE_TIMEOUT = 60.0 # keep-alive client connections idle longer than this are closed
+BACKEND_IDLE_TIMEOUT = 30.0
+MAX_BACKEND_CONNECTIONS = 256
+MAX_IDLE_BACKEND_CONNECTIONS = 64
+LISTEN_BACKLOG = 1024
+MAX_HEADER_BYTES = 64 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Per-connection headers that are not forwarded; Transfer-Encoding is kept since chunked bodies are relayed as-is
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'proxy-authenticate',
+                      'proxy-authorization', 'te', 'trailer', 'upgrade'}
+CHUNKED = 'chunked'
+
+# Balancing settings
+EWMA_ALPHA = 0.3               # weight of the newest latency sample
+FAILURE_LATENCY = 1.0          # seconds recorded for a failed request
+EWMA_FLOOR = 0.001             # keeps unmeasured servers from scoring zero forever
+HASH_VIRTUAL_NODES = 100       # ring points per unit of weight
+HASH_LOAD_FACTOR = 1.25        # bounded loads: no server takes more than 1.25x the average
+STICKY_HEADER = 'X-Session-Key'
+
+# Active health checks: TCP connect, or HTTP GET when a path is configured
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_JITTER = 0.2        # each wait varies by up to +-20% so probes do not synchronize
+HEALTH_CHECK_TIMEOUT = 1.0
+HEALTH_CHECK_RISE = 2            # consecutive passes before a down server is used again
+HEALTH_CHECK_FALL = 3            # consecutive failures before an up server is taken out
+HEALTH_CHECK_PATH = None
+MAX_CONCURRENT_PROBES = 128
+
+# Passive outlier ejection from live traffic
+OUTLIER_CONSECUTIVE_FAILURES = 5
+OUTLIER_WINDOW = 20              # recent requests per server the error rate is taken over
+OUTLIER_MIN_REQUESTS = 10
+OUTLIER_ERROR_RATE = 0.5
+OUTLIER_LATENCY_FACTOR = 3.0     # EWMA latency this many times the fleet median is an outlier
+OUTLIER_MIN_LATENCY = 0.05       # ...but only once it is above this many seconds
+OUTLIER_BASE_EJECTION = 30.0     # seconds, multiplied by the number of recent ejections
+OUTLIER_MAX_EJECTION_MULTIPLIER = 10
+OUTLIER_MAX_EJECTED_FRACTION = 0.5
+
+# Runtime backend registry
+DRAIN_TIMEOUT = 30.0             # in-flight requests on a removed server are cut off after this
+CONFIG_WATCH_INTERVAL = 1.0      # how often the backend file's mtime is checked
+ADMIN_HOST = '127.0.0.1'
+ADMIN_PORT = 8081
+MAX_ADMIN_BODY_BYTES = 1024 * 1024
+
 class Server:
-    def __init__(self, address, port):
+    def __init__(self, address, port, weight=1):
         self.address = address
         self.port = port
-        self.is_alive = True
+        self.weight = weight
+        # A server takes traffic while active health checks pass and it is not ejected
+        self._healthy = True
+        self.ejected = False
+        # Set once the server is removed from its balancer while requests are still in flight
+        self.draining = False
+        # Called with the server whenever is_alive flips, so balancers can update
+        self.listeners = []
+        # Request accounting, only mutated under the owning strategy's lock
+        self.outstanding = 0
+        self.ewma_latency = 0.0
 
-    def health_check(self):
-        # Simulate health check by randomly deciding if server is alive
-        self.is_alive = random.choice([True, False])
-        logging.info(f'Server {self.address}:{self.port} health check status: {self.is_alive}')
+    @property
+    def is_alive(self):
+        return self._healthy and not self.ejected
+
+    @is_alive.setter
+    def is_alive(self, alive):
+        self._set_state(healthy=alive)
+
+    @property
+    def healthy(self):
+        return self._healthy
+
+    def eject(self):
+        self._set_state(ejected=True)
+
+    def restore(self):
+        self._set_state(ejected=False)
+
+    def _set_state(self, healthy=None, ejected=None):
+        was_alive = self.is_alive
+        if healthy is not None:
+            self._healthy = healthy
+        if ejected is not None:
+            self.ejected = ejected
+        if self.is_alive != was_alive:
+            for listener in list(self.listeners):
+                listener(self)
+
+    async def health_check(self, path=HEALTH_CHECK_PATH, timeout=HEALTH_CHECK_TIMEOUT):
+        # A TCP connect, or with `path` an HTTP GET that must answer 2xx/3xx; changes no state
+        async def probe():
+            reader, writer = await asyncio.open_connection(self.address, self.port)
+            try:
+                if path is None:
+                    return True
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: {self.address}\r\nConnection: close\r\n\r\n'.encode())
+                head = await read_head(reader, timeout)
+                return head is not None and 200 <= int(head[0].split(' ', 2)[1]) < 400
+            finally:
+                writer.close()
+
+        try:
+            return await asyncio.wait_for(probe(), timeout)
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            return False
+
+def stable_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class BalancingStrategy:
+    # choose() only ever sees live servers; rebuild() runs on every membership or liveness change
+    name = None
 
-class LoadBalancer:
     def __init__(self):
+        self.lock = threading.Lock()
         self.servers = []
-        self.current_index = 0
+
+    def rebuild(self, servers):
+        with self.lock:
+            self.servers = list(servers)
+            self.rebuild_locked([server for server in self.servers if server.is_alive])
+
+    def select(self, key=None):
+        with self.lock:
+            server = self.choose(key)
+            if server is not None:
+                server.outstanding += 1
+                self.started(server)
+            return server
+
+    def release(self, server, latency, failed=False):
+        with self.lock:
+            server.outstanding = max(0, server.outstanding - 1)
+            sample = max(latency, FAILURE_LATENCY) if failed else latency
+            server.ewma_latency += EWMA_ALPHA * (sample - server.ewma_latency)
+            self.finished(server)
+
+    def rebuild_locked(self, alive):
+        raise NotImplementedError
+
+    def choose(self, key):
+        raise NotImplementedError
+
+    def started(self, server):
+        pass
+
+    def finished(self, server):
+        pass
+
+class RoundRobinStrategy(BalancingStrategy):
+    name = 'round_robin'
+
+    def rebuild_locked(self, alive):
+        self.alive = alive
+        self.index = 0
+
+    def choose(self, key):
+        if not self.alive:
+            return None
+        server = self.alive[self.index % len(self.alive)]
+        self.index += 1
+        return server
+
+class WeightedRoundRobinStrategy(BalancingStrategy):
+    # Stride scheduling: each pick moves a server 1/weight further along a shared clock, so picks
+    # interleave smoothly, and a liveness or membership change only reschedules the servers it touches
+    name = 'weighted_round_robin'
+
+    def __init__(self):
+        super().__init__()
+        self.heap = []           # (pass, order, server); entries whose pass is outdated are skipped
+        self.passes = {}         # live server -> (pass, weight)
+        self.clock = 0.0
+        self.order = itertools.count()
+
+    def rebuild_locked(self, alive):
+        live = set(alive)
+        for server in [server for server in self.passes if server not in live]:
+            del self.passes[server]
+        for server in alive:
+            weight = max(1, int(server.weight))
+            entry = self.passes.get(server)
+            if entry is None or entry[1] != weight:
+                # Servers join half a stride ahead of the clock, so they neither burst nor wait a full turn
+                self._schedule(server, self.clock + 0.5 / weight, weight)
+        if len(self.heap) > 2 * len(self.passes) + 16:
+            self.heap = [(pass_, next(self.order), server) for server, (pass_, _) in self.passes.items()]
+            heapq.heapify(self.heap)
+
+    def _schedule(self, server, pass_, weight):
+        self.passes[server] = (pass_, weight)
+        heapq.heappush(self.heap, (pass_, next(self.order), server))
+
+    def choose(self, key):
+        while self.heap:
+            pass_, _, server = heapq.heappop(self.heap)
+            entry = self.passes.get(server)
+            if entry is not None and entry[0] == pass_:
+                self.clock = pass_
+                self._schedule(server, pass_ + 1 / entry[1], entry[1])
+                return server
+        return None
+
+class LeastOutstandingStrategy(BalancingStrategy):
+    # Fewest in-flight requests per unit of weight, kept in an indexed heap
+    name = 'least_outstanding'
+
+    def rebuild_locked(self, alive):
+        self.sequence = 0
+        self.last_pick = {server: 0 for server in alive}
+        self.heap = sorted(alive, key=self._key)
+        self.positions = {server: position for position, server in enumerate(self.heap)}
+
+    def _key(self, server):
+        return (server.outstanding / max(server.weight, 1e-9), self.last_pick[server])
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i]] = i
+        self.positions[heap[j]] = j
+
+    def _sift(self, position):
+        heap = self.heap
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._key(heap[position]) >= self._key(heap[parent]):
+                break
+            self._swap(position, parent)
+            position = parent
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap) and self._key(heap[child]) < self._key(heap[smallest]):
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
+
+    def choose(self, key):
+        return self.heap[0] if self.heap else None
+
+    def started(self, server):
+        self.sequence += 1
+        self.last_pick[server] = self.sequence
+        self._sift(self.positions[server])
+
+    def finished(self, server):
+        # Servers that went down since being picked are no longer in the heap
+        if server in self.positions:
+            self._sift(self.positions[server])
+
+class PowerOfTwoChoicesStrategy(BalancingStrategy):
+    # Best of two random live servers by EWMA latency times (outstanding + 1) per unit of weight
+    name = 'power_of_two'
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self.rng = random.Random(seed)
+
+    def rebuild_locked(self, alive):
+        self.alive = alive
+
+    @staticmethod
+    def cost(server):
+        return (server.ewma_latency + EWMA_FLOOR) * (server.outstanding + 1) / max(server.weight, 1e-9)
+
+    def choose(self, key):
+        count = len(self.alive)
+        if count < 2:
+            return self.alive[0] if count else None
+        first = self.rng.randrange(count)
+        second = self.rng.randrange(count - 1)
+        second += second >= first
+        first, second = self.alive[first], self.alive[second]
+        return first if self.cost(first) <= self.cost(second) else second
+
+class ConsistentHashStrategy(BalancingStrategy):
+    # Consistent hashing with bounded loads: a hot key spills onto its ring neighbours
+    name = 'consistent_hash'
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.ring_members = None
+        self.ring_hashes = []
+        self.ring_servers = []
+
+    def rebuild_locked(self, alive):
+        # Liveness changes keep the ring; membership changes filter out and merge in only the servers that changed
+        members = {server: server.weight for server in self.servers}
+        if members != self.ring_members:
+            previous = self.ring_members or {}
+            gone = {server for server, weight in previous.items() if members.get(server) != weight}
+            hashes, servers = self.ring_hashes, self.ring_servers
+            if gone:
+                keep = [server not in gone for server in servers]
+                hashes = list(itertools.compress(hashes, keep))
+                servers = list(itertools.compress(servers, keep))
+            joined = sorted((point for server, weight in members.items() if previous.get(server) != weight
+                             for point in self.virtual_nodes(server, weight)), key=operator.itemgetter(0))
+            if len(joined) > len(hashes) // 4:
+                points = sorted(itertools.chain(zip(hashes, servers), joined), key=operator.itemgetter(0))
+                hashes = [point for point, _ in points]
+                servers = [server for _, server in points]
+            elif joined:
+                # A few new servers are merged in by copying the stretches of the ring between their points
+                merged_hashes, merged_servers, start = [], [], 0
+                for point, server in joined:
+                    end = bisect.bisect(hashes, point, start)
+                    merged_hashes += hashes[start:end]
+                    merged_servers += servers[start:end]
+                    merged_hashes.append(point)
+                    merged_servers.append(server)
+                    start = end
+                hashes = merged_hashes + hashes[start:]
+                servers = merged_servers + servers[start:]
+            self.ring_hashes, self.ring_servers = hashes, servers
+            self.ring_members = members
+        self.counted = set(alive)
+        self.alive_count = len(alive)
+        self.total_outstanding = sum(server.outstanding for server in alive)
+
+    @staticmethod
+    def virtual_nodes(server, weight):
+        return [(stable_hash(f'{server.address}:{server.port}#{replica}'), server)
+                for replica in range(max(1, int(HASH_VIRTUAL_NODES * weight)))]
+
+    def choose(self, key):
+        if not self.alive_count:
+            return None
+        point = stable_hash(key) if key is not None else self.rng.getrandbits(64)
+        bound = math.ceil(HASH_LOAD_FACTOR * (self.total_outstanding + 1) / self.alive_count)
+        start = bisect.bisect(self.ring_hashes, point)
+        ring_size = len(self.ring_servers)
+        # Some live server is always below the bound, so the walk ends within one turn
+        for step in range(ring_size):
+            server = self.ring_servers[(start + step) % ring_size]
+            if server.is_alive and server.outstanding < bound:
+                return server
+        return None
+
+    def started(self, server):
+        self.total_outstanding += 1
+
+    def finished(self, server):
+        # Requests on servers that went down or were removed were dropped from the total on rebuild
+        if server in self.counted:
+            self.total_outstanding = max(0, self.total_outstanding - 1)
+
+STRATEGIES = {strategy.name: strategy for strategy in (
+    RoundRobinStrategy, WeightedRoundRobinStrategy, LeastOutstandingStrategy,
+    PowerOfTwoChoicesStrategy, ConsistentHashStrategy)}
+
+class OutlierStats:
+    def __init__(self):
+        self.window = deque(maxlen=OUTLIER_WINDOW)
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+class OutlierDetector:
+    # Passive ejection on consecutive failures, error rate or EWMA latency against the fleet median
+    def __init__(self, consecutive_failures=OUTLIER_CONSECUTIVE_FAILURES, error_rate=OUTLIER_ERROR_RATE,
+                 min_requests=OUTLIER_MIN_REQUESTS, latency_factor=OUTLIER_LATENCY_FACTOR,
+                 min_latency=OUTLIER_MIN_LATENCY, base_ejection=OUTLIER_BASE_EJECTION,
+                 max_ejected_fraction=OUTLIER_MAX_EJECTED_FRACTION):
+        self.consecutive_failures = consecutive_failures
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.latency_factor = latency_factor
+        self.min_latency = min_latency
+        self.base_ejection = base_ejection
+        self.max_ejected_fraction = max_ejected_fraction
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.median_latency = None
+        self.median_updated_at = 0.0
+
+    def _fleet_median(self, servers, now):
+        # Recomputed at most once a second, so recording stays O(1) for large fleets
+        if now - self.median_updated_at >= 1.0:
+            latencies = sorted(server.ewma_latency for server in servers if server.is_alive)
+            self.median_latency = latencies[len(latencies) // 2] if latencies else None
+            self.median_updated_at = now
+        return self.median_latency
+
+    def record(self, server, failed, servers):
+        # Called once per finished request, after the strategy has updated server.ewma_latency
+        now = time.monotonic()
+        with self.lock:
+            stats = self.stats.setdefault(server, OutlierStats())
+            stats.window.append(failed)
+            stats.consecutive_failures = stats.consecutive_failures + 1 if failed else 0
+            if server.ejected:
+                return
+            failures = sum(stats.window)
+            if len(stats.window) == stats.window.maxlen and not failures:
+                stats.ejections = 0  # a clean window forgives earlier ejections
+            reason = None
+            if stats.consecutive_failures >= self.consecutive_failures:
+                reason = f'{stats.consecutive_failures} consecutive failures'
+            elif len(stats.window) >= self.min_requests and failures / len(stats.window) >= self.error_rate:
+                reason = f'error rate {failures / len(stats.window):.0%} over {len(stats.window)} requests'
+            elif len(stats.window) >= self.min_requests and server.ewma_latency >= self.min_latency:
+                median = self._fleet_median(servers, now)
+                if median and server.ewma_latency > self.latency_factor * median:
+                    reason = f'latency {server.ewma_latency * 1000:.0f} ms vs fleet median {median * 1000:.0f} ms'
+            if reason is None:
+                return
+            ejected = sum(1 for other in servers if other.ejected)
+            if ejected + 1 > self.max_ejected_fraction * len(servers):
+                return
+            stats.ejections += 1
+            duration = self.base_ejection * min(stats.ejections, OUTLIER_MAX_EJECTION_MULTIPLIER)
+            stats.ejected_until = now + duration
+            stats.window.clear()
+            stats.consecutive_failures = 0
+        logging.warning(f'Ejecting {server.address}:{server.port} for {duration:.0f}s: {reason}')
+        server.eject()
+
+    def forget(self, server):
+        with self.lock:
+            self.stats.pop(server, None)
+
+    def restore_expired(self, servers):
+        now = time.monotonic()
+        with self.lock:
+            expired = [server for server in servers
+                       if server.ejected and self.stats.get(server, OutlierStats()).ejected_until <= now]
+        for server in expired:
+            logging.info(f'Returning {server.address}:{server.port} from ejection')
+            server.restore()
+
+class LoadBalancer:
+    # self.servers is an immutable tuple swapped under update_lock, so readers take no lock.
+    # Removed servers drain; removal_listeners hear of them again once drained.
+    def __init__(self, strategy=None, outlier_detector=None):
+        self.servers = ()
+        self.update_lock = threading.Lock()
+        self.draining = set()
+        self.removal_listeners = []
+        self.strategy = strategy or RoundRobinStrategy()
+        self.strategy.rebuild(self.servers)
+        self.outlier_detector = outlier_detector
+
+    def set_strategy(self, strategy):
+        strategy.rebuild(self.servers)
+        self.strategy = strategy
+
+    def server_state_changed(self, server):
+        self.strategy.rebuild(self.servers)
 
     def add_server(self, server):
-        self.servers.append(server)
+        self.change_servers(added=(server,))
 
     def remove_server(self, server):
-        self.servers.remove(server)
+        self.change_servers(removed=(server,))
+
+    def update_server(self, server, weight):
+        self.change_servers(reweighted=((server, weight),))
+
+    def change_servers(self, added=(), removed=(), reweighted=()):
+        # A whole batch is published as one new tuple with a single strategy rebuild
+        with self.update_lock:
+            present = set(self.servers)
+            added = [server for server in dict.fromkeys(added) if server not in present]
+            removed = [server for server in dict.fromkeys(removed) if server in present]
+            reweighted = list(reweighted)
+            if not (added or removed or reweighted):
+                return
+            for server in added:
+                server.draining = False
+                self.draining.discard(server)
+                server.listeners.append(self.server_state_changed)
+            for server in removed:
+                server.listeners.remove(self.server_state_changed)
+                server.draining = True
+                self.draining.add(server)
+            for server, weight in reweighted:
+                server.weight = weight
+            gone = set(removed)
+            self.servers = tuple(server for server in self.servers if server not in gone) + tuple(added)
+            # The strategy can no longer pick removed servers, so their outstanding only goes down
+            self.strategy.rebuild(self.servers)
+        for server in removed:
+            if self.outlier_detector is not None:
+                self.outlier_detector.forget(server)
+            if server.outstanding:
+                logging.info(f'Draining {server.address}:{server.port} with {server.outstanding} requests in flight')
+                for listener in list(self.removal_listeners):
+                    listener(server, False)
+            self._finish_drain(server)
 
-    def get_next_server(self):
+    def _finish_drain(self, server):
+        # Both remove_server and the last release_server get here; the set makes it once
+        with self.update_lock:
+            if server.outstanding or server not in self.draining:
+                return
+            self.draining.remove(server)
+        logging.info(f'Removed {server.address}:{server.port}')
+        for listener in list(self.removal_listeners):
+            listener(server, True)
+
+    def get_next_server(self, key=None):
+        # `key` makes consistent hashing sticky and is ignored by other strategies
         if not self.servers:
             logging.warning("No servers available.")
             return None
-        
-        while True:
-            server = self.servers[self.current_index]
-            self.current_index = (self.current_index + 1) % len(self.servers)
-            if server.is_alive:
+        server = self.strategy.select(key)
+        if server is None:
+            logging.warning("All servers are down.")
+        return server
+
+    def release_server(self, server, latency, failed=False):
+        self.strategy.release(server, latency, failed)
+        if server.draining:
+            self._finish_drain(server)
+        elif self.outlier_detector is not None:
+            self.outlier_detector.record(server, failed, self.servers)
+
+def parse_backend(spec):
+    # Server from {"address": ..., "port": ..., "weight": ...} or "address:port"; raises ValueError
+    if isinstance(spec, str):
+        address, separator, port = spec.rpartition(':')
+        if not separator:
+            raise ValueError(f"Backend '{spec}' is not address:port")
+        spec = {'address': address, 'port': port}
+    if not isinstance(spec, dict):
+        raise ValueError(f"Backend must be an object or 'address:port', got {spec!r}")
+    address = spec.get('address')
+    if not isinstance(address, str) or not address:
+        raise ValueError(f"Backend {spec!r} has no address")
+    try:
+        port = int(spec.get('port'))
+        weight = float(spec.get('weight', 1))
+    except (TypeError, ValueError):
+        raise ValueError(f"Backend {spec!r} has an invalid port or weight")
+    if not 0 < port < 65536 or not weight > 0:
+        raise ValueError(f"Backend {spec!r} has an invalid port or weight")
+    return Server(address, port, weight=int(weight) if weight.is_integer() else weight)
+
+def load_backend_file(path):
+    # YAML needs PyYAML, which is only imported for .yaml/.yml files
+    with open(path) as file:
+        text = file.read()
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f'{path}: reading YAML backend files requires PyYAML')
+        try:
+            document = yaml.safe_load(text)
+        except yaml.YAMLError as error:
+            raise ValueError(f'{path}: {error}')
+    else:
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError as error:
+            raise ValueError(f'{path}: {error}')
+    if isinstance(document, dict):
+        document = document.get('backends')
+    if not isinstance(document, list):
+        raise ValueError(f'{path}: expected a list of backends or {{"backends": [...]}}')
+    return document
+
+class BackendRegistry:
+    # Runtime membership of a LoadBalancer, keyed by address and port
+    def __init__(self, load_balancer):
+        self.load_balancer = load_balancer
+        self.lock = threading.Lock()
+
+    def find(self, address, port):
+        for server in self.load_balancer.servers:
+            if server.address == address and server.port == port:
                 return server
-            else:
-                logging.warning(f"Server {server.address}:{server.port} is down, trying next one...")
-
-class RequestHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        if parsed_path.path == "/health":
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b'OK')
+        return None
+
+    def add(self, spec):
+        # The new server, or ValueError for an invalid spec or one already registered
+        server = parse_backend(spec)
+        with self.lock:
+            if self.find(server.address, server.port) is not None:
+                raise ValueError(f'Backend {server.address}:{server.port} already exists')
+            self.load_balancer.add_server(server)
+        logging.info(f'Added {server.address}:{server.port} (weight {server.weight})')
+        return server
+
+    def remove(self, address, port):
+        with self.lock:
+            server = self.find(address, port)
+            if server is not None:
+                self.load_balancer.remove_server(server)
+        return server
+
+    def apply(self, specs):
+        # Every spec is validated before anything changes
+        wanted = {}
+        for spec in specs:
+            server = parse_backend(spec)
+            wanted[(server.address, server.port)] = server
+        with self.lock:
+            current = {(server.address, server.port): server for server in self.load_balancer.servers}
+            removed = [server for endpoint, server in current.items() if endpoint not in wanted]
+            reweighted = [(server, wanted[endpoint].weight) for endpoint, server in current.items()
+                          if endpoint in wanted and wanted[endpoint].weight != server.weight]
+            added = [server for endpoint, server in wanted.items() if endpoint not in current]
+            self.load_balancer.change_servers(added, removed, reweighted)
+        changes = {'added': ['%s:%d' % (server.address, server.port) for server in added],
+                   'removed': ['%s:%d' % (server.address, server.port) for server in removed],
+                   'updated': ['%s:%d' % (server.address, server.port) for server, _ in reweighted]}
+        if any(changes.values()):
+            logging.info(f'Backends changed: {changes}')
+        return changes
+
+    def load_file(self, path):
+        return self.apply(load_backend_file(path))
+
+    async def watch_file(self, path, interval=CONFIG_WATCH_INTERVAL):
+        # A file that fails to parse or validate leaves the current backends in place
+        seen = None
+        while True:
+            try:
+                stat = os.stat(path)
+                version = (stat.st_mtime_ns, stat.st_size)
+                if version != seen:
+                    seen = version
+                    # Parsing and rebuilding a large file would otherwise stall every connection
+                    await asyncio.to_thread(self.load_file, path)
+            except (OSError, ValueError) as error:
+                logging.error(f'Not applying backend file: {error}')
+            await asyncio.sleep(interval)
+
+    def describe(self):
+        def entry(server):
+            return {'address': server.address, 'port': server.port, 'weight': server.weight,
+                    'alive': server.is_alive, 'healthy': server.healthy, 'ejected': server.ejected,
+                    'draining': server.draining, 'outstanding': server.outstanding,
+                    'ewma_latency_ms': round(server.ewma_latency * 1000, 3)}
+
+        return {'strategy': self.load_balancer.strategy.name,
+                'backends': [entry(server) for server in self.load_balancer.servers],
+                'draining': [entry(server) for server in list(self.load_balancer.draining)]}
+
+class ProxyError(Exception):
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+class ClientError(ProxyError):
+    # The client sent a request that cannot be relayed; the backend is not at fault
+    pass
+
+async def read_head(reader, timeout):
+    # (start line, [(name, value)]) of the next message, or None at a clean EOF
+    try:
+        data = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+    except asyncio.IncompleteReadError as error:
+        if not error.partial:
+            return None
+        raise
+    lines = data[:-4].decode('latin-1').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+def header_fields(headers):
+    return {name.lower(): value for name, value in headers}
+
+def body_length(fields, default):
+    # CHUNKED, a byte count, or `default` when the message has no framing headers
+    if CHUNKED in fields.get('transfer-encoding', '').lower():
+        return CHUNKED
+    if 'content-length' in fields:
+        length = int(fields['content-length'])
+        if length < 0:
+            raise ValueError("Negative Content-Length")
+        return length
+    return default
+
+def forwarded_head(start_line, headers, extra=()):
+    # Serialized head without hop-by-hop headers, including any the Connection header names
+    fields = header_fields(headers)
+    dropped = HOP_BY_HOP_HEADERS | {token.strip().lower() for token in fields.get('connection', '').split(',')}
+    lines = [start_line]
+    lines += [f'{name}: {value}' for name, value in headers if name.lower() not in dropped]
+    lines += [f'{name}: {value}' for name, value in extra]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+class _DiscardWriter:
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+async def relay_exact(reader, writer, length, timeout):
+    while length:
+        data = await asyncio.wait_for(reader.read(min(length, STREAM_CHUNK_BYTES)), timeout)
+        if not data:
+            raise asyncio.IncompleteReadError(b'', length)
+        writer.write(data)
+        await writer.drain()
+        length -= len(data)
+
+async def relay_body(reader, writer, length, timeout):
+    # Streams one body without buffering it; writer=None discards it
+    writer = writer or _DiscardWriter()
+    if length == CHUNKED:
+        while True:
+            size_line = await asyncio.wait_for(reader.readuntil(b'\r\n'), timeout)
+            writer.write(size_line)
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                while True:
+                    trailer = await asyncio.wait_for(reader.readuntil(b'\r\n'), timeout)
+                    writer.write(trailer)
+                    if trailer == b'\r\n':
+                        break
+                await writer.drain()
+                return
+            await relay_exact(reader, writer, size + 2, timeout)
+    elif length is None:
+        while True:
+            data = await asyncio.wait_for(reader.read(STREAM_CHUNK_BYTES), timeout)
+            if not data:
+                return
+            writer.write(data)
+            await writer.drain()
+    else:
+        await relay_exact(reader, writer, length, timeout)
+
+def simple_response(status, reason, body, keep_alive, content_type='text/plain'):
+    connection = 'keep-alive' if keep_alive else 'close'
+    return (f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: {connection}\r\n\r\n').encode('latin-1') + body
+
+class BackendPool:
+    # Keep-alive connections to one backend, most recently used handed out first
+    def __init__(self, server, max_connections=MAX_BACKEND_CONNECTIONS, max_idle=MAX_IDLE_BACKEND_CONNECTIONS,
+                 connect_timeout=CONNECT_TIMEOUT, idle_timeout=BACKEND_IDLE_TIMEOUT):
+        self.server = server
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.slots = asyncio.Semaphore(max_connections)
+        self.idle = deque()
+        self.active = set()
+
+    async def acquire(self):
+        # (reader, writer, reused); raises asyncio.TimeoutError or OSError
+        await asyncio.wait_for(self.slots.acquire(), self.connect_timeout)
+        now = time.monotonic()
+        while self.idle:
+            reader, writer, released_at = self.idle.pop()
+            if now - released_at < self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                self.active.add(writer)
+                return reader, writer, True
+            writer.close()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server.address, self.server.port, limit=MAX_HEADER_BYTES),
+                self.connect_timeout)
+        except BaseException:
+            self.slots.release()
+            raise
+        self.active.add(writer)
+        return reader, writer, False
+
+    def release(self, reader, writer, reusable):
+        # Connections to a draining server are not kept, as no new request will use them
+        self.active.discard(writer)
+        if (reusable and len(self.idle) < self.max_idle and not writer.is_closing()
+                and not self.server.draining):
+            self.idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        self.slots.release()
+
+    def close(self, force=False):
+        # Closes the idle connections; with force also those carrying requests, which then fail
+        while self.idle:
+            self.idle.pop()[1].close()
+        if force:
+            for writer in list(self.active):
+                writer.close()
+
+class ReverseProxy:
+    # HTTP/1.1 reverse proxy on asyncio with per-server connection pools
+    def __init__(self, load_balancer, host='', port=8080, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, client_idle_timeout=CLIENT_IDLE_TIMEOUT,
+                 max_backend_connections=MAX_BACKEND_CONNECTIONS,
+                 max_idle_backend_connections=MAX_IDLE_BACKEND_CONNECTIONS, sticky_header=STICKY_HEADER,
+                 drain_timeout=DRAIN_TIMEOUT):
+        self.load_balancer = load_balancer
+        self.sticky_header = sticky_header.lower()
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client_idle_timeout = client_idle_timeout
+        self.max_backend_connections = max_backend_connections
+        self.max_idle_backend_connections = max_idle_backend_connections
+        self.drain_timeout = drain_timeout
+        self.pools = {}
+        self.listener = None
+        self.loop = None
+
+    def pool(self, server):
+        pool = self.pools.get(server)
+        if pool is None:
+            pool = self.pools[server] = BackendPool(server, self.max_backend_connections,
+                                                    self.max_idle_backend_connections, self.connect_timeout)
+        return pool
+
+    def server_removed(self, server, drained):
+        # Removal listener; the balancer may call it from any thread
+        self.loop.call_soon_threadsafe(self.drain_pool, server, drained)
+
+    def drain_pool(self, server, drained):
+        pool = self.pools.get(server)
+        if pool is None or not server.draining:
             return
-        
-        server = load_balancer.get_next_server()
-        if not server:
-            self.send_response(503)
-            self.end_headers()
-            self.wfile.write(b'Service Unavailable')
+        if drained:
+            del self.pools[server]
+            pool.close()
             return
+        pool.close()
+        self.loop.call_later(self.drain_timeout, self.force_drain, server, pool)
+
+    def force_drain(self, server, pool):
+        if self.pools.get(server) is pool and server.draining:
+            logging.warning(f'{server.address}:{server.port} did not drain within {self.drain_timeout:.0f}s, '
+                            f'closing {len(pool.active)} connections')
+            del self.pools[server]
+            pool.close(force=True)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.load_balancer.removal_listeners.append(self.server_removed)
+        self.listener = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                                   limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG)
+        self.port = self.listener.sockets[0].getsockname()[1]
+        logging.info(f'Load balancer listening on port {self.port}')
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.listener:
+            await self.listener.serve_forever()
+
+    async def close(self):
+        self.load_balancer.removal_listeners.remove(self.server_removed)
+        self.listener.close()
+        await self.listener.wait_closed()
+        for pool in self.pools.values():
+            pool.close()
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                head = await read_head(reader, self.client_idle_timeout)
+                if head is None or not await self.handle_request(head, reader, writer, peer):
+                    break
+        except ClientError as error:
+            # Closing the transport still flushes the response
+            logging.debug(f'{error.status} for client {peer}: {error.reason}')
+            writer.write(simple_response(error.status, error.reason, error.reason.encode(), False))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, head, reader, writer, peer):
+        # Returns whether the client connection can carry another request
+        request_line, headers = head
+        fields = header_fields(headers)
+        try:
+            method, target, version = request_line.split(' ', 2)
+            request_length = body_length(fields, 0)
+        except ValueError:
+            raise ClientError(400, 'Bad Request')
+        keep_alive = version == 'HTTP/1.1' and fields.get('connection', '').lower() != 'close'
+
+        if urlparse(target).path == "/health":
+            await self.relay_request_body(reader, None, request_length)
+            writer.write(simple_response(200, 'OK', b'OK', keep_alive))
+            await writer.drain()
+            return keep_alive
+
+        client_address = peer[0] if peer else None
+        server = self.load_balancer.get_next_server(fields.get(self.sticky_header, client_address))
+        if not server:
+            await self.relay_request_body(reader, None, request_length)
+            writer.write(simple_response(503, 'Service Unavailable', b'Service Unavailable', keep_alive))
+            await writer.drain()
+            return keep_alive
 
         # Forward the request to the selected server
-        logging.info(f'Forwarding request to {server.address}:{server.port}')
-        
-        time.sleep(0.1)  # Simulate network delay
-        
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(f'Response from {server.address}:{server.port}'.encode())
+        logging.debug(f'Forwarding {method} {target} to {server.address}:{server.port}')
+        forwarded_for = ', '.join(filter(None, [fields.get('x-forwarded-for'), client_address]))
+        request_head = forwarded_head(f'{method} {target} HTTP/1.1', headers,
+                                      [('X-Forwarded-For', forwarded_for)] if forwarded_for else ())
+        start = time.perf_counter()
+        failed = False
+        try:
+            keep_alive, status = await self.forward(server, method, request_head, request_length, reader, writer,
+                                                    keep_alive)
+            # 5xx answers count against the backend for passive outlier ejection
+            failed = status >= 500
+            return keep_alive
+        except ClientError:
+            raise
+        except ProxyError as error:
+            failed = True
+            logging.warning(f'{error.status} for {method} {target} via {server.address}:{server.port}: {error.reason}')
+            # Part of the request body may still be unread, so the client connection is closed
+            writer.write(simple_response(error.status, error.reason, error.reason.encode(), False))
+            await writer.drain()
+            return False
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # The response head is already relayed, so the client connection is closed
+            failed = True
+            logging.warning(f'Incomplete response for {method} {target} from {server.address}:{server.port}')
+            return False
+        finally:
+            self.load_balancer.release_server(server, time.perf_counter() - start, failed)
+
+    async def relay_request_body(self, reader, writer, length):
+        # Only reads from the client are timed, so timeouts and short bodies are the client's fault
+        try:
+            await relay_body(reader, writer, length, self.read_timeout)
+        except asyncio.TimeoutError:
+            raise ClientError(408, 'Request Timeout')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            raise ClientError(400, 'Bad Request')
+        except ConnectionError:
+            # A reset client poisons its reader; anything else came from writing to the backend
+            if reader.exception() is None:
+                raise
+            raise ClientError(400, 'Bad Request')
+
+    async def send_request(self, pool, request_head, request_length, reader):
+        # A stale reused connection is replaced once, if no request body has been read yet
+        for attempt in range(2):
+            try:
+                backend_reader, backend_writer, reused = await pool.acquire()
+            except asyncio.TimeoutError:
+                raise ProxyError(504, 'Gateway Timeout')
+            except OSError:
+                raise ProxyError(502, 'Bad Gateway')
+            sent = False
+            try:
+                backend_writer.write(request_head)
+                await self.relay_request_body(reader, backend_writer, request_length)
+                await backend_writer.drain()
+                response_head = await read_head(backend_reader, self.read_timeout)
+                if response_head is None:
+                    raise ConnectionResetError('Backend closed the connection')
+                sent = True
+                return backend_reader, backend_writer, response_head
+            except asyncio.TimeoutError:
+                raise ProxyError(504, 'Gateway Timeout')
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                if not (reused and request_length == 0 and attempt == 0):
+                    raise ProxyError(502, 'Bad Gateway')
+            finally:
+                # Every failure, whatever it raised, closes the connection and frees its slot
+                if not sent:
+                    pool.release(backend_reader, backend_writer, False)
+
+    async def forward(self, server, method, request_head, request_length, reader, writer, keep_alive):
+        pool = self.pool(server)
+        backend_reader, backend_writer, (status_line, headers) = await self.send_request(
+            pool, request_head, request_length, reader)
+        reusable = False
+        try:
+            status = int(status_line.split(' ', 2)[1])
+            while 100 <= status < 200 and status != 101:
+                # Interim responses such as 100 Continue are relayed before the final one
+                writer.write(forwarded_head(status_line, headers))
+                response_head = await read_head(backend_reader, self.read_timeout)
+                if response_head is None:
+                    raise ConnectionResetError('Backend closed the connection')
+                status_line, headers = response_head
+                status = int(status_line.split(' ', 2)[1])
+            fields = header_fields(headers)
+            response_length = 0 if method == 'HEAD' or status in (101, 204, 304) else body_length(fields, None)
+            # A body delimited by EOF can only be relayed by closing the client connection too
+            keep_alive = keep_alive and response_length is not None
+            backend_keep_alive = (status_line.startswith('HTTP/1.1') and response_length is not None
+                                  and fields.get('connection', '').lower() != 'close')
+            writer.write(forwarded_head(status_line, headers, [('Connection', 'keep-alive' if keep_alive else 'close')]))
+            await relay_body(backend_reader, writer, response_length, self.read_timeout)
+            await writer.drain()
+            reusable = backend_keep_alive
+        finally:
+            pool.release(backend_reader, backend_writer, reusable)
+        return keep_alive, status
+
+class HealthChecker:
+    # Active health checks, each server on its own jittered schedule
+    def __init__(self, load_balancer, interval=HEALTH_CHECK_INTERVAL, timeout=HEALTH_CHECK_TIMEOUT,
+                 rise=HEALTH_CHECK_RISE, fall=HEALTH_CHECK_FALL, path=HEALTH_CHECK_PATH,
+                 jitter=HEALTH_CHECK_JITTER, max_concurrent_probes=MAX_CONCURRENT_PROBES, seed=None):
+        self.load_balancer = load_balancer
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.path = path
+        self.jitter = jitter
+        self.max_concurrent_probes = max_concurrent_probes
+        self.rng = random.Random(seed)
+        self.streaks = {}
+        self.tasks = {}
+
+    def record(self, server, passed):
+        # Applies one probe result to the (passes, failures) streak and flips health at the thresholds
+        passes, failures = self.streaks.get(server, (0, 0))
+        passes, failures = (passes + 1, 0) if passed else (0, failures + 1)
+        self.streaks[server] = (passes, failures)
+        if passed and not server.healthy and passes >= self.rise:
+            logging.info(f'Server {server.address}:{server.port} passed {passes} health checks, marking up')
+            server.is_alive = True
+        elif not passed and server.healthy and failures >= self.fall:
+            logging.warning(f'Server {server.address}:{server.port} failed {failures} health checks, marking down')
+            server.is_alive = False
+
+    async def probe_loop(self, server, slots):
+        await asyncio.sleep(self.rng.uniform(0, self.interval))
+        while True:
+            async with slots:
+                passed = await server.health_check(self.path, self.timeout)
+            logging.debug(f'Server {server.address}:{server.port} health check status: {passed}')
+            self.record(server, passed)
+            await asyncio.sleep(self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    async def run(self):
+        slots = asyncio.Semaphore(self.max_concurrent_probes)
+        try:
+            while True:
+                servers = self.load_balancer.servers
+                members = set(servers)
+                for server in servers:
+                    if server not in self.tasks:
+                        self.tasks[server] = asyncio.create_task(self.probe_loop(server, slots))
+                for server in [server for server in self.tasks if server not in members]:
+                    self.tasks.pop(server).cancel()
+                    self.streaks.pop(server, None)
+                if self.load_balancer.outlier_detector is not None:
+                    self.load_balancer.outlier_detector.restore_expired(servers)
+                await asyncio.sleep(min(1.0, self.interval))
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+
+class AdminServer:
+    # JSON admin endpoint: GET/POST/PUT /backends and DELETE /backends/<address>:<port>
+    def __init__(self, registry, host=ADMIN_HOST, port=ADMIN_PORT, timeout=CLIENT_IDLE_TIMEOUT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.listener = None
+
+    async def start(self):
+        self.listener = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                                   limit=MAX_HEADER_BYTES)
+        self.port = self.listener.sockets[0].getsockname()[1]
+        logging.info(f'Admin endpoint listening on {self.host}:{self.port}')
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.listener:
+            await self.listener.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                head = await read_head(reader, self.timeout)
+                if head is None:
+                    break
+                request_line, headers = head
+                method, target, version = request_line.split(' ', 2)
+                fields = header_fields(headers)
+                keep_alive = version == 'HTTP/1.1' and fields.get('connection', '').lower() != 'close'
+                length = body_length(fields, 0)
+                if length == CHUNKED or length > MAX_ADMIN_BODY_BYTES:
+                    status, payload = 413, {'message': 'Body must have a Content-Length of at most '
+                                                       f'{MAX_ADMIN_BODY_BYTES} bytes'}
+                    keep_alive = False
+                else:
+                    body = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+                    status, payload = self.handle_request(method, urlparse(target).path, body)
+                reason = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                          405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large'}[status]
+                writer.write(simple_response(status, reason, json.dumps(payload).encode(), keep_alive,
+                                             'application/json'))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def handle_request(self, method, path, body):
+        # (status, JSON payload)
+        if path == '/backends':
+            if method == 'GET':
+                return 200, self.registry.describe()
+            if method not in ('POST', 'PUT'):
+                return 405, {'message': 'Use GET, POST or PUT'}
+            try:
+                document = json.loads(body or b'null')
+                if method == 'POST':
+                    server = self.registry.add(document)
+                    return 201, {'message': 'Backend added', 'backend': f'{server.address}:{server.port}'}
+                if isinstance(document, dict):
+                    document = document.get('backends')
+                if not isinstance(document, list):
+                    raise ValueError('Expected a list of backends or {"backends": [...]}')
+                return 200, self.registry.apply(document)
+            except ValueError as error:
+                conflict = method == 'POST' and 'already exists' in str(error)
+                return (409 if conflict else 400), {'message': str(error)}
+        if path.startswith('/backends/'):
+            if method != 'DELETE':
+                return 405, {'message': 'Use DELETE'}
+            address, _, port = path[len('/backends/'):].rpartition(':')
+            server = self.registry.remove(address, int(port)) if port.isdigit() else None
+            if server is None:
+                return 404, {'message': 'Backend not found'}
+            return 202, {'message': 'Backend removed, draining' if server.draining else 'Backend removed',
+                         'outstanding': server.outstanding}
+        return 404, {'message': 'Not found'}
+
+async def serve(load_balancer, port=8080, admin_host=ADMIN_HOST, admin_port=ADMIN_PORT, backend_file=None):
+    proxy = ReverseProxy(load_balancer, port=port)
+    registry = BackendRegistry(load_balancer)
+    services = [proxy.serve_forever(), HealthChecker(load_balancer).run()]
+    if admin_port is not None:
+        services.append(AdminServer(registry, admin_host, admin_port).serve_forever())
+    if backend_file is not None:
+        # The file replaces the built-in servers; a bad file at startup is fatal
+        await asyncio.to_thread(registry.load_file, backend_file)
+        services.append(registry.watch_file(backend_file))
+    await asyncio.gather(*services)
 
 def run_load_balancer_server():
+    parser = argparse.ArgumentParser(description='HTTP load balancer')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--admin-host', default=ADMIN_HOST)
+    parser.add_argument('--admin-port', type=int, default=ADMIN_PORT, help='0 picks a free port, -1 disables')
+    parser.add_argument('--backends', help='JSON or YAML backend file, watched for changes')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default=RoundRobinStrategy.name)
+    args = parser.parse_args()
+    load_balancer.set_strategy(STRATEGIES[args.strategy]())
     logging.info('Starting load balancer server...')
-    server_address = ('', 8080)
-    httpd = HTTPServer(server_address, RequestHandler)
-    httpd.serve_forever()
-
-def health_check_servers():
-    while True:
-        logging.info('Performing health checks on servers...')
-        for server in load_balancer.servers:
-            server.health_check()
-        time.sleep(5)
+    asyncio.run(serve(load_balancer, args.port, args.admin_host, None if args.admin_port < 0 else args.admin_port,
+                      args.backends))
 
 # Create load balancer instance
-load_balancer = LoadBalancer()
+load_balancer = LoadBalancer(outlier_detector=OutlierDetector())
 
-# Add servers to the load balancer
+# Default servers, replaced by --backends or the admin endpoint at runtime
 load_balancer.add_server(Server('192.168.1.1', 80))
 load_balancer.add_server(Server('192.168.1.2', 80))
 load_balancer.add_server(Server('192.168.1.3', 80))
 
-# Start health checking in a separate thread
-health_check_thread = threading.Thread(target=health_check_servers, daemon=True)
-health_check_thread.start()
-
-# Start the load balancer server
-run_load_balancer_server()
\ No newline at end of file
+if __name__ == "__main__":
+    # Start the load balancer server together with its health checks
+    run_load_balancer_server()
@@ -0,0 +1,114 @@
+import time
+import asyncio
+import argparse
+import logging
+
+from load_balancer import (LISTEN_BACKLOG, STRATEGIES, LoadBalancer, Server, ReverseProxy, body_length,
+                           header_fields, read_head, relay_body)
+
+# Throughput and tail latency of load_balancer.ReverseProxy against in-process stub
+# backends. Stubs, proxy and client share one event loop, so the "direct" row (client
+# to backends, round robin, no proxy) is the baseline to read the proxy's overhead
+# against. The previous blocking handler topped out near 10 req/s.
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+async def start_stub_backend(response_bytes, delay):
+    # Keep-alive HTTP/1.1 server answering every request with `response_bytes` bytes
+    # after `delay` seconds
+    body = b'x' * response_bytes
+    response = (f'HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await read_head(reader, 60)
+                if head is None:
+                    break
+                await relay_body(reader, None, body_length(header_fields(head[1]), 0), 60)
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.CancelledError):
+            # Cancelled when the benchmark shuts down with pooled proxy connections still open
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0, backlog=LISTEN_BACKLOG)
+
+async def client(ports, index, deadline, latencies, errors):
+    port = ports[index % len(ports)]
+    connection = None
+    request = b'GET /item HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            reader, writer = connection
+            writer.write(request)
+            status_line, headers = await read_head(reader, 30)
+            fields = header_fields(headers)
+            await relay_body(reader, None, body_length(fields, None), 30)
+            if int(status_line.split()[1]) >= 500:
+                errors.append(status_line)
+            if fields.get('connection', '').lower() == 'close':
+                writer.close()
+                connection = None
+        except (OSError, TypeError, asyncio.IncompleteReadError, asyncio.TimeoutError) as error:
+            errors.append(error)
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - start)
+    if connection is not None:
+        connection[1].close()
+
+async def measure(ports, concurrency, duration):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(ports, index, start + duration, latencies, errors) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, sorted(latencies), len(errors)
+
+async def run(args):
+    backends = [await start_stub_backend(args.response_bytes, args.backend_delay / 1000) for _ in range(args.backends)]
+    backend_ports = [backend.sockets[0].getsockname()[1] for backend in backends]
+    balancer = LoadBalancer(STRATEGIES[args.strategy]())
+    for port in backend_ports:
+        balancer.add_server(Server('127.0.0.1', port))
+    proxy = ReverseProxy(balancer, host='127.0.0.1', port=0)
+    await proxy.start()
+
+    print(f"{'target':>8} {'conns':>6} {'req/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'p99.9 (ms)':>10} "
+          f"{'max (ms)':>9} {'errors':>7}")
+    for concurrency in [int(value) for value in args.concurrency.split(',')]:
+        for target, ports in (('direct', backend_ports), ('proxy', [proxy.port])):
+            throughput, latencies, errors = await measure(ports, concurrency, args.duration)
+            print(f'{target:>8} {concurrency:>6} {throughput:>10.1f} {percentile(latencies, 0.5) * 1000:>9.2f} '
+                  f'{percentile(latencies, 0.99) * 1000:>9.2f} {percentile(latencies, 0.999) * 1000:>10.2f} '
+                  f'{(latencies[-1] if latencies else float("nan")) * 1000:>9.2f} {errors:>7}')
+
+    await proxy.close()
+    for backend in backends:
+        backend.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Reverse proxy benchmark with in-process stub backends')
+    parser.add_argument('--backends', type=int, default=3)
+    parser.add_argument('--concurrency', default='10,100,500', help='comma separated client connection counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per measurement')
+    parser.add_argument('--response-bytes', type=int, default=1024)
+    parser.add_argument('--backend-delay', type=float, default=0.0, help='milliseconds per backend response')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='round_robin')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
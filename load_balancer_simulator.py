@@ -0,0 +1,99 @@
+import heapq
+import random
+import logging
+import argparse
+from collections import deque
+
+from load_balancer import STRATEGIES, LoadBalancer, Server
+
+# Discrete-event simulation of the balancing strategies in load_balancer against
+# backends of different speeds. Requests arrive as a Poisson process at `load` times
+# the fleet's total capacity; every backend serves `slots` requests at a time with
+# exponential service times scaled by its speed and queues the rest FIFO. The real
+# strategy objects pick servers and receive each request's latency on completion,
+# so EWMA and outstanding counts behave as they would in the proxy.
+
+def simulate(strategy_name, speeds, weights, slots, load, base_service, requests, num_keys, seed):
+    rng = random.Random(seed)
+    strategy = STRATEGIES[strategy_name]
+    balancer = LoadBalancer(strategy(seed=seed) if strategy_name in ('power_of_two', 'consistent_hash') else strategy())
+    servers = [Server(f'10.0.0.{index + 1}', 80, weight=weight) for index, weight in enumerate(weights)]
+    for server in servers:
+        balancer.add_server(server)
+    speed = dict(zip(servers, speeds))
+    busy = {server: 0 for server in servers}
+    queues = {server: deque() for server in servers}
+    served = {server: 0 for server in servers}
+
+    arrival_rate = load * sum(speeds) * slots / base_service
+    events = []  # (time, sequence, server or None for an arrival, arrival time)
+    sequence = 0
+    now = 0.0
+    latencies = []
+
+    def start(server, arrived):
+        nonlocal sequence
+        busy[server] += 1
+        sequence += 1
+        heapq.heappush(events, (now + rng.expovariate(speed[server] / base_service), sequence, server, arrived))
+
+    heapq.heappush(events, (rng.expovariate(arrival_rate), 0, None, 0.0))
+    arrivals = 1
+    while events:
+        now, _, server, arrived = heapq.heappop(events)
+        if server is None:
+            # Skewed keys, so consistent hashing sees hot keys as well as a long tail
+            key = f'user{int(rng.paretovariate(1.2)) % num_keys}'
+            target = balancer.get_next_server(key)
+            if busy[target] < slots:
+                start(target, now)
+            else:
+                queues[target].append(now)
+            if arrivals < requests:
+                sequence += 1
+                heapq.heappush(events, (now + rng.expovariate(arrival_rate), sequence, None, 0.0))
+                arrivals += 1
+            continue
+        busy[server] -= 1
+        served[server] += 1
+        latencies.append(now - arrived)
+        balancer.release_server(server, now - arrived)
+        if queues[server]:
+            start(server, queues[server].popleft())
+
+    latencies.sort()
+    total = len(latencies)
+    shares = [served[server] / total for server in servers]
+    return latencies, shares
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load balancing strategies by simulated tail latency')
+    parser.add_argument('--speeds', default='1,1,1,2,4', help='comma separated relative backend speeds')
+    parser.add_argument('--unweighted', action='store_true', help='give every server weight 1 instead of its speed')
+    parser.add_argument('--slots', type=int, default=4, help='concurrent requests per backend')
+    parser.add_argument('--load', type=float, default=0.8, help='offered load as a fraction of total capacity')
+    parser.add_argument('--service-ms', type=float, default=10.0, help='mean service time at speed 1')
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=10000, help='distinct sticky keys')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    speeds = [float(value) for value in args.speeds.split(',')]
+    weights = [1.0] * len(speeds) if args.unweighted else speeds
+    print(f'speeds {speeds}, weights {weights}, load {args.load:.0%}, {args.slots} slots per backend, latency in ms')
+    print(f"{'strategy':>22} {'mean':>8} {'p50':>8} {'p99':>8} {'p99.9':>8} {'max':>8}   share per server")
+    for name in args.strategies.split(','):
+        latencies, shares = simulate(name, speeds, weights, args.slots, args.load, args.service_ms / 1000,
+                                     args.requests, args.keys, args.seed)
+        mean = sum(latencies) / len(latencies)
+        print(f'{name:>22} ' + ' '.join(f'{value * 1000:>8.1f}' for value in (
+            mean, percentile(latencies, 0.5), percentile(latencies, 0.99), percentile(latencies, 0.999), latencies[-1]))
+            + '   ' + ' '.join(f'{share:.0%}' for share in shares))
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,105 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from qiskit import QuantumCircuit, Aer, execute
-from qiskit.visualization import plot_state_qsphere, plot_bloch_multivector, plot_histogram
+from statevector_simulator import Circuit, Parameter, simulate, parameter_sweep
+from statevector_measurement import sample_counts, marginal_probabilities, bloch_vectors
 
-# Function to create a simple quantum circuit
-def create_circuit():
-    circuit = QuantumCircuit(2)
+# Circuits are built as lightweight Circuit gate lists and simulated by the built-in
+# NumPy engine. By default they are still handed out as qiskit QuantumCircuits and
+# results as qiskit Statevectors; as_qiskit=False and as_array=True keep qiskit out
+# entirely. matplotlib is only imported by the plotting functions.
+
+# Function to create a simple quantum circuit; as_qiskit=False returns the Circuit
+def create_circuit(as_qiskit=True):
+    circuit = Circuit(2)
     circuit.h(0)  # Apply Hadamard gate to qubit 0
     circuit.cx(0, 1)  # Apply CNOT gate to qubit 1
-    return circuit
-
-# Function to simulate the quantum circuit
-def simulate_circuit(circuit):
-    # Use Aer's qasm_simulator
+    return circuit.to_qiskit() if as_qiskit else circuit
+
+# Function to simulate the quantum circuit. Returns a qiskit Statevector for either
+# engine, or with as_array=True the bare amplitude array
+def simulate_circuit(circuit, engine='numpy', dtype=np.complex128, as_array=False):
+    if engine == 'numpy' and not isinstance(circuit, Circuit):
+        try:
+            circuit = Circuit.from_qiskit(circuit)
+        except ValueError:
+            # Unbound parameters fail on Aer too; measurements, resets and other non-unitary operations need it
+            if circuit.parameters:
+                raise
+            engine = 'aer'
+    if engine == 'numpy':
+        # Built-in statevector engine, no transpilation
+        statevector = simulate(circuit, dtype=dtype)
+        return statevector if as_array else _as_statevector(statevector)
+    if engine != 'aer':
+        raise ValueError(f"Unknown engine '{engine}', expected 'numpy' or 'aer'")
+
+    from qiskit import Aer, execute
+    if isinstance(circuit, Circuit):
+        circuit = circuit.to_qiskit()
+
+    # Use Aer's statevector_simulator
     simulator = Aer.get_backend('statevector_simulator')
     
     # Execute circuit on simulator
     result = execute(circuit, backend=simulator).result()
     
     # Get the state vector
-    statevector = result.get_statevector()
-    return statevector
+    statevector = np.asarray(result.get_statevector(), dtype=dtype)
+    return statevector if as_array else _as_statevector(statevector)
+
+def _as_statevector(statevector):
+    from qiskit.quantum_info import Statevector
+    return Statevector(statevector)
 
 # Function to visualize quantum states on Q-sphere
 def visualize_qsphere(statevector):
+    import matplotlib.pyplot as plt
+    from qiskit.visualization import plot_state_qsphere
     plot_state_qsphere(statevector)
     plt.title("Quantum State Q-sphere")
     plt.show()
 
-# Function to visualize qubit states on Bloch sphere
-def visualize_bloch(statevector):
-    # Extracting individual qubit states
-    state_0 = statevector[0]
-    state_1 = statevector[1]
-
-    # Prepare Bloch vectors
-    bloch_vector_0 = [2 * np.real(state_0), 2 * np.imag(state_0), np.abs(state_0) ** 2]
-    bloch_vector_1 = [2 * np.real(state_1), 2 * np.imag(state_1), np.abs(state_1) ** 2]
-
-    # Visualizing Bloch sphere
-    fig, axes = plt.subplots(1, 2, subplot_kw=dict(projection='3d'))
-    axes[0].set_title("Qubit 0")
-    axes[1].set_title("Qubit 1")
-
-    for ax, bloch_vector in zip(axes, [bloch_vector_0, bloch_vector_1]):
+# Function to visualize qubit states on Bloch sphere. Bloch vectors come from each
+# qubit's reduced density matrix (see bloch_vectors), so this works for any number
+# of qubits and mixed single-qubit states. With `path` the figure is rendered
+# headless through matplotlib's object API and saved; with plot=False nothing is
+# drawn and matplotlib is not imported. Returns the (n, 3) Bloch vectors.
+def visualize_bloch(statevector, plot=True, path=None, columns=4):
+    vectors = bloch_vectors(statevector)
+    if not plot and path is None:
+        return vectors
+
+    if path is None:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
+    else:
+        from matplotlib.figure import Figure
+        figure = Figure()
+
+    num_qubits = len(vectors)
+    columns = min(columns, num_qubits)
+    rows = -(-num_qubits // columns)
+    figure.set_size_inches(3 * columns, 3 * rows)
+    for qubit, bloch_vector in enumerate(vectors):
+        ax = figure.add_subplot(rows, columns, qubit + 1, projection='3d')
+        ax.set_title(f"Qubit {qubit}")
         ax.quiver(0, 0, 0, bloch_vector[0], bloch_vector[1], bloch_vector[2],
                   color='r', arrow_length_ratio=0.1)
+        ax.set_xlim(-1, 1)
+        ax.set_ylim(-1, 1)
+        ax.set_zlim(-1, 1)
         ax.set_xlabel('X-axis')
         ax.set_ylabel('Y-axis')
         ax.set_zlabel('Z-axis')
 
-    plt.show()
+    if path is None:
+        plt.show()
+    else:
+        figure.savefig(path)
+    return vectors
 
-# Function to implement Grover's Algorithm
-def grovers_algorithm(num_qubits=2):
-    circuit = QuantumCircuit(num_qubits)
+# Function to implement Grover's Algorithm; as_qiskit=False returns the Circuit
+def grovers_algorithm(num_qubits=2, as_qiskit=True):
+    circuit = Circuit(num_qubits)
 
     # Initialize the qubits
     circuit.h(range(num_qubits))
@@ -72,21 +117,54 @@ def grovers_algorithm(num_qubits=2):
     circuit.x(range(num_qubits))
     circuit.h(range(num_qubits))
 
+    return circuit.to_qiskit() if as_qiskit else circuit
+
+# Function to build a Grover circuit template whose oracle phases are sweep parameters.
+# Binding both phases to pi reproduces grovers_algorithm().
+def grovers_template(num_qubits=2):
+    circuit = Circuit(num_qubits)
+    circuit.h(range(num_qubits))
+
+    # Parameterized oracle: phase on qubit 1 and controlled phase on (0, 1)
+    circuit.p(Parameter('oracle_phase'), 1)
+    circuit.cp(Parameter('oracle_controlled_phase'), 0, 1)
+
+    circuit.h(range(num_qubits))
+    circuit.x(range(num_qubits))
+    circuit.h(num_qubits - 1)
+    circuit.cx(0, 1)
+    circuit.h(num_qubits - 1)
+    circuit.x(range(num_qubits))
+    circuit.h(range(num_qubits))
+
     return circuit
 
+# Function to simulate every row of a parameter matrix against a circuit template.
+# Returns one (rows, 2^n) array instead of a list of statevectors.
+def simulate_sweep(template, parameter_values, processes=None, dtype=np.complex128):
+    return parameter_sweep(template, parameter_values, processes=processes, dtype=dtype)
+
 # Function to perform Grover's search simulation
 def simulate_grovers():
     circuit = grovers_algorithm()
     statevector = simulate_circuit(circuit)
     return statevector
 
-# Function to analyze the output of a quantum measurement
-def analyze_output(statevector):
+# Function to analyze the output of a quantum measurement. With `shots` it samples a
+# sparse qiskit-style counts dict, with only `qubits` it returns their marginal
+# probabilities; without either it returns the full probability vector.
+def analyze_output(statevector, shots=None, qubits=None, seed=None):
+    if shots is not None:
+        return sample_counts(statevector, shots, qubits=qubits, seed=seed)
+    if qubits is not None:
+        return marginal_probabilities(statevector, qubits)
     counts = np.abs(statevector) ** 2
     return counts
 
 # Main function to run the simulations
 def main():
+    import matplotlib.pyplot as plt
+
     print("Running simple quantum circuit simulation...")
     circuit = create_circuit()
     statevector = simulate_circuit(circuit)
@@ -99,14 +177,17 @@ def main():
     grover_statevector = simulate_grovers()
     print(f"Grover's Statevector: {grover_statevector}")
 
-    output_counts = analyze_output(grover_statevector)
+    shots = 1024
+    output_counts = analyze_output(grover_statevector, shots=shots)
     print(f"Output counts: {output_counts}")
 
-    plt.bar(range(len(output_counts)), output_counts)
+    # Only observed outcomes are plotted, so this scales with the counts, not 2^n
+    states = sorted(output_counts)
+    plt.bar(range(len(states)), [output_counts[state] / shots for state in states])
     plt.title("Output Probability Distribution")
     plt.xlabel("State")
     plt.ylabel("Probability")
-    plt.xticks(range(len(output_counts)), [f"|{i}> " for i in range(len(output_counts))])
+    plt.xticks(range(len(states)), [f"|{state}> " for state in states])
     plt.show()
 
 if __name__ == "__main__":
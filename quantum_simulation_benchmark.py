@@ -0,0 +1,71 @@
+import time
+import argparse
+import numpy as np
+from quantum_computing_simulations import create_circuit, grovers_algorithm, simulate_circuit
+from statevector_simulator import Circuit, simulate, fusion_report, clear_compile_cache
+
+# Compares the built-in NumPy statevector engine with the Aer path of
+# simulate_circuit: correctness on the repo's circuits, then wall time on layered
+# random circuits of increasing width, and the effect of gate fusion.
+
+def layered_circuit(num_qubits, depth, seed=0):
+    rng = np.random.default_rng(seed)
+    circuit = Circuit(num_qubits)
+    for layer in range(depth):
+        circuit.h(range(num_qubits))
+        for qubit in range(num_qubits):
+            circuit.rz(float(rng.uniform(0, 2 * np.pi)), qubit)
+        # Brickwork entangling pattern, alternating even and odd pairs
+        for qubit in range(layer % 2, num_qubits - 1, 2):
+            circuit.cx(qubit, qubit + 1)
+    return circuit
+
+def time_engine(circuit, engine, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        statevector = simulate_circuit(circuit, engine=engine, as_array=True)
+    return (time.perf_counter() - start) / repeats, statevector
+
+def main():
+    parser = argparse.ArgumentParser(description='NumPy statevector engine vs Aer')
+    parser.add_argument('--min-qubits', type=int, default=2)
+    parser.add_argument('--max-qubits', type=int, default=22)
+    parser.add_argument('--step', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    for name, circuit in [('create_circuit', create_circuit()), ('grovers_algorithm', grovers_algorithm())]:
+        numpy_state = simulate_circuit(circuit, engine='numpy', as_array=True)
+        aer_state = simulate_circuit(circuit, engine='aer', as_array=True)
+        print(f'{name}: max |numpy - aer| = {np.max(np.abs(numpy_state - aer_state)):.2e}')
+
+    print(f"{'qubits':>6} {'numpy (s)':>12} {'aer (s)':>12} {'speed-up':>9} {'max diff':>10}")
+    for num_qubits in range(args.min_qubits, args.max_qubits + 1, args.step):
+        circuit = layered_circuit(num_qubits, args.depth)
+        numpy_time, numpy_state = time_engine(circuit, 'numpy', args.repeats)
+        aer_time, aer_state = time_engine(circuit, 'aer', args.repeats)
+        difference = np.max(np.abs(numpy_state - aer_state))
+        print(f'{num_qubits:>6} {numpy_time:>12.5f} {aer_time:>12.5f} {aer_time / numpy_time:>8.1f}x {difference:>10.1e}')
+
+    print(f"\n{'qubits':>6} {'gates':>6} {'fused':>6} {'unfused (s)':>12} {'fused (s)':>10} "
+          f"{'speed-up':>9} {'compile (s)':>12}")
+    for num_qubits in range(args.min_qubits, args.max_qubits + 1, args.step):
+        circuit = layered_circuit(num_qubits, args.depth)
+        clear_compile_cache()
+        start = time.perf_counter()
+        report = fusion_report(circuit)
+        compile_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            simulate(circuit, fuse=False)
+        unfused_time = (time.perf_counter() - start) / args.repeats
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            simulate(circuit)  # compiled program comes from the cache
+        fused_time = (time.perf_counter() - start) / args.repeats
+        print(f"{num_qubits:>6} {report['gates_before']:>6} {report['gates_after']:>6} {unfused_time:>12.5f} "
+              f"{fused_time:>10.5f} {unfused_time / fused_time:>8.1f}x {compile_time:>12.5f}")
+
+if __name__ == "__main__":
+    main()
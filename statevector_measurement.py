@@ -0,0 +1,134 @@
+import numpy as np
+
+# Measurement on statevectors without materializing full output distributions.
+# Results are sparse dicts in qiskit counts format: keys are bitstrings of the
+# measured qubits with the highest-numbered qubit leftmost. The statevector is read
+# in blocks of 2^BLOCK_QUBITS amplitudes, so extra memory is bounded by one block
+# (plus the 2^k marginal when measuring k qubits) regardless of the number of shots.
+
+BLOCK_QUBITS = 16
+
+def _num_qubits(statevector):
+    num_qubits = int(statevector.size).bit_length() - 1
+    if statevector.size != 1 << num_qubits:
+        raise ValueError(f"Statevector length {statevector.size} is not a power of two")
+    return num_qubits
+
+def _blocks(block_source, size):
+    # Yields (offset, probabilities) for consecutive blocks of a flat array
+    block = 1 << BLOCK_QUBITS
+    for offset in range(0, size, block):
+        yield offset, block_source(offset, min(offset + block, size))
+
+def _sample_blocks(block_source, size, shots, rng):
+    # Exact multinomial sampling in two passes: shots are first split across blocks
+    # in proportion to each block's total probability, then within every block.
+    # Memory is one block of probabilities, independent of the number of shots.
+    totals = np.array([probabilities.sum() for _, probabilities in _blocks(block_source, size)])
+    block_shots = rng.multinomial(shots, totals / totals.sum())
+    for (offset, probabilities), count in zip(_blocks(block_source, size), block_shots):
+        if count == 0:
+            continue
+        outcomes = rng.multinomial(count, probabilities / probabilities.sum())
+        for index in np.flatnonzero(outcomes):
+            yield offset + int(index), int(outcomes[index])
+
+def marginal_distribution(statevector, qubits):
+    # Probability array over `qubits` (index bit j = j-th smallest selected qubit),
+    # reduced block by block over the reshaped axes of the unselected qubits
+    statevector = np.asarray(statevector).reshape(-1)
+    num_qubits = _num_qubits(statevector)
+    qubits = sorted(set(qubits))
+    block_qubits = min(num_qubits, BLOCK_QUBITS)
+    low = [qubit for qubit in qubits if qubit < block_qubits]
+    high = [qubit for qubit in qubits if qubit >= block_qubits]
+    # Axis i of a reshaped block holds qubit block_qubits - 1 - i
+    summed_axes = tuple(block_qubits - 1 - qubit for qubit in range(block_qubits) if qubit not in low)
+    low_range = np.arange(1 << len(low))
+
+    marginal = np.zeros(1 << len(qubits))
+    for block_index in range(1 << (num_qubits - block_qubits)):
+        start = block_index << block_qubits
+        amplitudes = statevector[start:start + (1 << block_qubits)]
+        probabilities = (amplitudes.real ** 2 + amplitudes.imag ** 2).reshape((2,) * block_qubits)
+        reduced = probabilities.sum(axis=summed_axes) if summed_axes else probabilities
+        high_value = sum(((block_index >> (qubit - block_qubits)) & 1) << position
+                         for position, qubit in enumerate(high))
+        marginal[(high_value << len(low)) + low_range] += np.ravel(reduced)
+    return marginal
+
+def marginal_probabilities(statevector, qubits, tolerance=1e-12):
+    # Sparse {bitstring: probability} over `qubits`, dropping outcomes below `tolerance`
+    qubits = sorted(set(qubits))
+    marginal = marginal_distribution(statevector, qubits)
+    width = len(qubits)
+    return {format(int(index), f'0{width}b'): float(marginal[index])
+            for index in np.flatnonzero(marginal > tolerance)}
+
+def sample_counts(statevector, shots, qubits=None, seed=None):
+    # Draws `shots` measurements of `qubits` (all qubits by default) and returns a
+    # sparse counts dict like qiskit's get_counts()
+    statevector = np.asarray(statevector).reshape(-1)
+    num_qubits = _num_qubits(statevector)
+    rng = np.random.default_rng(seed)
+    if qubits is None or sorted(set(qubits)) == list(range(num_qubits)):
+        width = num_qubits
+
+        def block_source(start, stop):
+            amplitudes = statevector[start:stop]
+            return amplitudes.real ** 2 + amplitudes.imag ** 2
+        size = statevector.size
+    else:
+        width = len(set(qubits))
+        marginal = marginal_distribution(statevector, qubits)
+
+        def block_source(start, stop):
+            return marginal[start:stop]
+        size = marginal.size
+    return {format(index, f'0{width}b'): count
+            for index, count in _sample_blocks(block_source, size, shots, rng)}
+
+def _coherence(amplitudes, bit):
+    # <psi_1|psi_0> for the qubit on `bit` of a flat array. Viewed as
+    # (segments, 2, 2^bit), both halves of every segment are contiguous, so each
+    # segment pair is one BLAS dot product and nothing is copied.
+    pairs = amplitudes.reshape(-1, 2, 1 << bit)
+    return sum(np.vdot(pair[1], pair[0]) for pair in pairs)
+
+def bloch_vectors(statevector):
+    # (n, 3) array with row q = (x, y, z) of qubit q, from its reduced density matrix
+    # rho_q = Tr_{others} |psi><psi|: x - iy = 2 rho_q[0, 1] = 2 <psi_1|psi_0> and
+    # z = p0 - p1, where psi_0/psi_1 are the amplitudes with qubit q clear/set.
+    # No density matrix is materialized: the state is viewed as a 2^h x 2^k matrix
+    # (k = n // 2 low qubits on the columns) and every partial trace is a reduction
+    # over long contiguous segments of it or of its transpose.
+    statevector = np.asarray(statevector).reshape(-1)
+    num_qubits = _num_qubits(statevector)
+    low_qubits = num_qubits // 2
+    matrix = statevector.reshape(-1, 1 << low_qubits)
+
+    # Populations: row sums give the high qubits, column sums the low qubits
+    row_sums = np.empty(matrix.shape[0])
+    column_sums = np.zeros(matrix.shape[1])
+    rows_per_block = max(1, (1 << BLOCK_QUBITS) // matrix.shape[1])
+    for start in range(0, matrix.shape[0], rows_per_block):
+        block = matrix[start:start + rows_per_block]
+        probabilities = block.real ** 2 + block.imag ** 2
+        row_sums[start:start + rows_per_block] = probabilities.sum(axis=1)
+        column_sums += probabilities.sum(axis=0)
+    total = row_sums.sum()
+    excited = np.empty(num_qubits)
+    for qubit in range(num_qubits):
+        if qubit < low_qubits:
+            excited[qubit] = column_sums[(np.arange(column_sums.size) >> qubit) & 1 == 1].sum()
+        else:
+            excited[qubit] = row_sums[(np.arange(row_sums.size) >> (qubit - low_qubits)) & 1 == 1].sum()
+
+    # Coherences: low qubits are paired in the transposed layout, where they sit
+    # above the high qubits, so no qubit is paired over segments shorter than 2^(n/2)
+    high_qubits = num_qubits - low_qubits
+    transposed = np.ascontiguousarray(matrix.T).reshape(-1) if low_qubits else None
+    coherence = np.array([_coherence(transposed, qubit + high_qubits) if qubit < low_qubits
+                          else _coherence(statevector, qubit) for qubit in range(num_qubits)])
+    vectors = np.column_stack([2 * coherence.real, -2 * coherence.imag, total - 2 * excited])
+    return vectors / total
@@ -0,0 +1,491 @@
+from itertools import repeat
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Pure-NumPy statevector simulator. Qubit ordering follows qiskit: qubit 0 is the
+# least significant bit of the basis-state index, so results match Aer's
+# statevector_simulator element for element.
+
+_SQRT_HALF = 1 / np.sqrt(2)
+
+# Fixed single-qubit gates
+SINGLE_QUBIT_GATES = {
+    'id': np.eye(2),
+    'h': np.array([[1, 1], [1, -1]]) * _SQRT_HALF,
+    'x': np.array([[0, 1], [1, 0]]),
+    'y': np.array([[0, -1j], [1j, 0]]),
+    'z': np.diag([1, -1]),
+    's': np.diag([1, 1j]),
+    'sdg': np.diag([1, -1j]),
+    't': np.diag([1, np.exp(1j * np.pi / 4)]),
+    'tdg': np.diag([1, np.exp(-1j * np.pi / 4)]),
+}
+
+# Fixed two-qubit gates. Rows and columns are indexed by 2 * bit(qubits[0]) + bit(qubits[1]),
+# so for controlled gates the first qubit is the control.
+TWO_QUBIT_GATES = {
+    'cx': np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]),
+    'cz': np.diag([1, 1, 1, -1]),
+    'swap': np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]]),
+}
+
+def _parametric(rows, theta):
+    # Builds a (d, d) matrix for a scalar angle, or (batch, d, d) for an array of angles
+    theta = np.asarray(theta, dtype=np.float64)
+    entries = [np.broadcast_to(np.asarray(entry, dtype=np.complex128), theta.shape) for row in rows for entry in row]
+    return np.stack(entries, axis=-1).reshape(theta.shape + (len(rows), len(rows)))
+
+# Parameterized gates, built from their angle (a scalar, or an array for batched sweeps)
+PARAMETRIC_GATES = {
+    'rx': lambda theta: _parametric([[np.cos(theta / 2), -1j * np.sin(theta / 2)],
+                                     [-1j * np.sin(theta / 2), np.cos(theta / 2)]], theta),
+    'ry': lambda theta: _parametric([[np.cos(theta / 2), -np.sin(theta / 2)],
+                                     [np.sin(theta / 2), np.cos(theta / 2)]], theta),
+    'rz': lambda theta: _parametric([[np.exp(-0.5j * theta), 0], [0, np.exp(0.5j * theta)]], theta),
+    'p': lambda theta: _parametric([[1, 0], [0, np.exp(1j * theta)]], theta),
+    'cp': lambda theta: _parametric([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, np.exp(1j * theta)]], theta),
+}
+
+# Amplitudes per stacked batch in parameter_sweep, bounding the working set
+SWEEP_BATCH_AMPLITUDES = 1 << 22
+
+# Fused matrix entries below this magnitude are treated as exact zeros
+FUSION_TOLERANCE = 1e-12
+
+# Compiled (fused) programs kept by compile_circuit, keyed by circuit structure
+COMPILE_CACHE_SIZE = 256
+_compile_cache = OrderedDict()
+
+class Parameter:
+    # Named placeholder for a gate angle, bound per row of a parameter sweep.
+    # Compared by name so it survives pickling into worker processes.
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Parameter) and other.name == self.name
+
+    def __hash__(self):
+        return hash(('Parameter', self.name))
+
+    def __repr__(self):
+        return f"Parameter('{self.name}')"
+
+class Circuit:
+    # Lightweight gate list with the QuantumCircuit methods used in this repo, so
+    # circuits can be built and simulated without importing qiskit.
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self.gates = []  # (name, qubits, params)
+
+    def _targets(self, qubits):
+        return [qubits] if isinstance(qubits, int) else list(qubits)
+
+    def append(self, name, qubits, params=()):
+        for qubit in qubits:
+            if not 0 <= qubit < self.num_qubits:
+                raise ValueError(f"Qubit {qubit} out of range for a {self.num_qubits}-qubit circuit")
+        self.gates.append((name, tuple(qubits), tuple(params)))
+        return self
+
+    def _single(self, name, qubits, params=()):
+        for qubit in self._targets(qubits):
+            self.append(name, (qubit,), params)
+        return self
+
+    def h(self, qubits):
+        return self._single('h', qubits)
+
+    def x(self, qubits):
+        return self._single('x', qubits)
+
+    def y(self, qubits):
+        return self._single('y', qubits)
+
+    def z(self, qubits):
+        return self._single('z', qubits)
+
+    def s(self, qubits):
+        return self._single('s', qubits)
+
+    def t(self, qubits):
+        return self._single('t', qubits)
+
+    def rx(self, theta, qubits):
+        return self._single('rx', qubits, (theta,))
+
+    def ry(self, theta, qubits):
+        return self._single('ry', qubits, (theta,))
+
+    def rz(self, theta, qubits):
+        return self._single('rz', qubits, (theta,))
+
+    def p(self, theta, qubits):
+        return self._single('p', qubits, (theta,))
+
+    def cx(self, control, target):
+        return self.append('cx', (control, target))
+
+    def cz(self, control, target):
+        return self.append('cz', (control, target))
+
+    def cp(self, theta, control, target):
+        return self.append('cp', (control, target), (theta,))
+
+    def swap(self, qubit1, qubit2):
+        return self.append('swap', (qubit1, qubit2))
+
+    def unitary(self, matrix, qubits):
+        # Arbitrary 2^k x 2^k matrix, indexed big-endian over `qubits` like TWO_QUBIT_GATES
+        return self.append('unitary', qubits, (np.asarray(matrix),))
+
+    @property
+    def parameters(self):
+        # Unbound parameters in order of first use; this is the column order of sweeps
+        parameters = []
+        for _, _, params in self.gates:
+            for param in params:
+                if isinstance(param, Parameter) and param not in parameters:
+                    parameters.append(param)
+        return parameters
+
+    def bind(self, values):
+        # New circuit with parameters replaced, from a {name: value} dict or a sequence
+        # ordered like `parameters`
+        if not isinstance(values, dict):
+            values = {param.name: value for param, value in zip(self.parameters, values)}
+        bound = Circuit(self.num_qubits)
+        for name, qubits, params in self.gates:
+            bound.gates.append((name, qubits, tuple(
+                values[param.name] if isinstance(param, Parameter) else param for param in params)))
+        return bound
+
+    def to_qiskit(self):
+        from qiskit import QuantumCircuit
+        from qiskit.circuit import Parameter as QiskitParameter
+        from qiskit.circuit.library import UnitaryGate
+
+        circuit = QuantumCircuit(self.num_qubits)
+        qiskit_parameters = {param: QiskitParameter(param.name) for param in self.parameters}
+        for name, qubits, params in self.gates:
+            if name == 'unitary':
+                # qiskit matrices are little-endian over their qargs, ours big-endian
+                circuit.append(UnitaryGate(params[0]), list(reversed(qubits)))
+            else:
+                params = [qiskit_parameters.get(param, param) if isinstance(param, Parameter) else param
+                          for param in params]
+                getattr(circuit, name)(*params, *qubits)
+        return circuit
+
+    @classmethod
+    def from_qiskit(cls, quantum_circuit):
+        # Raises ValueError for unbound parameters, and for measurements, resets and other
+        # operations without a unitary
+        from qiskit.circuit.exceptions import CircuitError
+
+        if quantum_circuit.parameters:
+            names = ', '.join(param.name for param in quantum_circuit.parameters)
+            raise ValueError(f"Circuit has unbound parameters {names}; bind them with assign_parameters()")
+        circuit = cls(quantum_circuit.num_qubits)
+        for instruction in quantum_circuit.data:
+            operation = instruction.operation
+            qubits = [quantum_circuit.find_bit(qubit).index for qubit in instruction.qubits]
+            name = operation.name
+            if name == 'barrier':
+                continue
+            if name in SINGLE_QUBIT_GATES or name in TWO_QUBIT_GATES:
+                circuit.append(name, qubits)
+            elif name in PARAMETRIC_GATES:
+                circuit.append(name, qubits, [float(param) for param in operation.params])
+            else:
+                try:
+                    matrix = operation.to_matrix()
+                except (AttributeError, CircuitError):
+                    raise ValueError(f"Operation '{name}' has no unitary matrix")
+                circuit.unitary(matrix, list(reversed(qubits)))
+        phase = float(quantum_circuit.global_phase)
+        if phase and circuit.num_qubits:
+            # The phase rides on qubit 0 as exp(i phase) * I, which fusion folds into its neighbours
+            circuit.unitary(np.exp(1j * phase) * np.eye(2), [0])
+        return circuit
+
+def gate_matrix(name, params=()):
+    if name in SINGLE_QUBIT_GATES:
+        return SINGLE_QUBIT_GATES[name]
+    if name in TWO_QUBIT_GATES:
+        return TWO_QUBIT_GATES[name]
+    if name in PARAMETRIC_GATES:
+        return PARAMETRIC_GATES[name](*params)
+    if name == 'unitary':
+        return params[0]
+    raise ValueError(f"Unsupported gate '{name}'")
+
+# Amplitudes processed per block by apply_gate, sized to stay in the L2 cache
+BLOCK_AMPLITUDES = 1 << 14
+
+def apply_gate(state, num_qubits, matrix, qubits):
+    # Applies a gate in place. `state` is one (2^n,) statevector or a stacked (batch, 2^n)
+    # tensor; `matrix` is one (2^k, 2^k) matrix shared by every state, or (batch, 2^k, 2^k)
+    # with one matrix per state. The state is reshaped so every target qubit is its
+    # own length-2 axis with the untouched qubits between them merged, and processed
+    # in cache-sized blocks.
+    descending = sorted(qubits, reverse=True)
+    shape, previous = [], num_qubits
+    for qubit in descending:
+        shape += [1 << (previous - 1 - qubit), 2]
+        previous = qubit
+    shape.append(1 << previous)
+    axes = [2 * descending.index(qubit) + 1 for qubit in qubits]
+
+    if matrix.ndim == 3:
+        # Per-state matrices: add a leading batch axis and block over whole states
+        batch = matrix.shape[0]
+        tensor = state.reshape([batch] + shape)
+        axes = [axis + 1 for axis in axes]
+        step = max(1, BLOCK_AMPLITUDES >> num_qubits)
+        for start in range(0, batch, step):
+            block_matrix = np.moveaxis(matrix[start:start + step], 0, -1)
+            block_matrix = block_matrix.reshape(block_matrix.shape + (1,) * (len(shape) - len(qubits)))
+            _apply_block(tensor[start:start + step], block_matrix, axes)
+        return state
+
+    # A shared matrix treats the batch as extra high-order amplitudes
+    shape[0] *= state.size >> num_qubits
+    tensor = state.reshape(shape)
+    # Prefer the outermost merged axis that can be split into enough blocks, since
+    # slicing it keeps each block contiguous
+    blocks_needed = max(1, state.size // BLOCK_AMPLITUDES)
+    merged_axes = range(0, len(shape), 2)
+    block_axis = next((axis for axis in merged_axes if shape[axis] >= blocks_needed),
+                      max(merged_axes, key=lambda axis: shape[axis]))
+    step = max(1, BLOCK_AMPLITUDES * shape[block_axis] // state.size)
+    index = [slice(None)] * len(shape)
+    for start in range(0, shape[block_axis], step):
+        index[block_axis] = slice(start, start + step)
+        _apply_block(tensor[tuple(index)], matrix, axes)
+    return state
+
+def _apply_block(tensor, matrix, axes):
+    # Splits the block into 2^k sub-views, one per basis state of the target qubits.
+    # Rows are written in order, so a sub-view is only copied when a later row still
+    # reads it: diagonal gates need no scratch memory, H and CX copy one sub-view.
+    # matrix[row, column] is a scalar or an array broadcasting against the sub-views.
+    dimension = 1 << len(axes)
+    views = []
+    for basis in range(dimension):
+        index = [slice(None)] * tensor.ndim
+        for position, axis in enumerate(axes):
+            index[axis] = (basis >> (len(axes) - 1 - position)) & 1
+        views.append(tensor[tuple(index)])
+
+    nonzero = (matrix != 0).reshape(dimension, dimension, -1).any(axis=2)
+    sources = [views[column].copy() if nonzero[column + 1:, column].any() else views[column]
+               for column in range(dimension)]
+    scratch = np.empty_like(views[0])
+    for row in range(dimension):
+        view = views[row]
+        terms = [(column, matrix[row, column]) for column in range(dimension)
+                 if column != row and nonzero[row, column]]
+        if not nonzero[row, row]:
+            if not terms:
+                view[...] = 0
+                continue
+            column, coefficient = terms.pop(0)
+            np.multiply(sources[column], coefficient, out=view)
+        elif np.any(matrix[row, row] != 1):
+            view *= matrix[row, row]
+        for column, coefficient in terms:
+            np.multiply(sources[column], coefficient, out=scratch)
+            view += scratch
+
+def _gate_cost(matrix):
+    # Approximate number of full-state memory passes apply_gate makes for `matrix`:
+    # two per off-diagonal term, one per non-unit diagonal entry, one per copied sub-view
+    dimension = len(matrix)
+    nonzero = matrix != 0
+    off_diagonal = nonzero.sum() - np.trace(nonzero)
+    scaled = sum(1 for row in range(dimension) if nonzero[row, row] and matrix[row, row] != 1)
+    copies = sum(1 for column in range(dimension) if nonzero[column + 1:, column].any())
+    return (2 * off_diagonal + scaled + copies) / dimension
+
+def _clean(matrix):
+    # Snap fusion round-off so structure (diagonal, permutation) is kept by apply_gate
+    matrix = matrix.copy()
+    matrix.real[np.abs(matrix.real) < FUSION_TOLERANCE] = 0
+    matrix.imag[np.abs(matrix.imag) < FUSION_TOLERANCE] = 0
+    return matrix
+
+def _embed(matrix, qubit, pair):
+    # Lifts a single-qubit matrix on `qubit` to the 4x4 basis of `pair`
+    identity = np.eye(2)
+    return np.kron(matrix, identity) if qubit == pair[0] else np.kron(identity, matrix)
+
+def _structure_key(circuit):
+    key = [circuit.num_qubits]
+    for name, qubits, params in circuit.gates:
+        params = tuple((param.shape, param.tobytes()) if isinstance(param, np.ndarray) else param
+                       for param in params)
+        key.append((name, qubits, params))
+    return tuple(key)
+
+def fuse_gates(circuit):
+    # Returns an equivalent Circuit of fused 'unitary' gates. Runs of single-qubit gates
+    # on a qubit are multiplied into one 2x2 matrix; they and consecutive gates on the
+    # same qubit pair are folded into a 4x4 matrix whenever that does not raise the
+    # estimated memory traffic. Parameterized and wider gates are kept as they are.
+    pending = {}  # qubit -> accumulated 2x2 matrix not yet emitted
+    program = []  # [name, qubits, params]; fused entries are ['unitary', qubits, [matrix]]
+    last_op = {}  # qubit -> index in program of the last operation touching it
+
+    def flush(qubit):
+        if qubit in pending:
+            program.append(['unitary', (qubit,), [_clean(pending.pop(qubit))]])
+            last_op[qubit] = len(program) - 1
+
+    for name, qubits, params in circuit.gates:
+        if any(isinstance(param, Parameter) for param in params) or len(qubits) > 2:
+            for qubit in qubits:
+                flush(qubit)
+            program.append([name, qubits, list(params)])
+            for qubit in qubits:
+                last_op[qubit] = len(program) - 1
+            continue
+
+        matrix = np.asarray(gate_matrix(name, params), dtype=np.complex128)
+        if len(qubits) == 1:
+            qubit = qubits[0]
+            index = last_op.get(qubit)
+            if qubit not in pending and index is not None and program[index][0] == 'unitary' \
+                    and len(program[index][1]) == 2:
+                # Fold into the preceding two-qubit operation if that is no more expensive
+                previous = program[index][2][0]
+                fused = _clean(_embed(matrix, qubit, program[index][1]) @ previous)
+                if _gate_cost(fused) <= _gate_cost(previous) + _gate_cost(matrix):
+                    program[index][2][0] = fused
+                    continue
+            pending[qubit] = matrix @ pending.get(qubit, np.eye(2))
+            continue
+
+        pair = tuple(qubits)
+        for qubit in pair:
+            if qubit in pending:
+                # Absorb single-qubit gates waiting on either qubit if no more expensive
+                absorbed = _clean(matrix @ _embed(pending[qubit], qubit, pair))
+                if _gate_cost(absorbed) <= _gate_cost(matrix) + _gate_cost(pending[qubit]):
+                    matrix = absorbed
+                    del pending[qubit]
+                else:
+                    flush(qubit)
+        index = last_op.get(pair[0])
+        if index is not None and index == last_op.get(pair[1]) and program[index][0] == 'unitary' \
+                and set(program[index][1]) == set(pair):
+            # Consecutive gates on the same pair become one 4x4 matrix
+            previous = program[index][2][0]
+            if program[index][1] != pair:
+                swap = TWO_QUBIT_GATES['swap']
+                previous = swap @ previous @ swap
+            fused = _clean(matrix @ previous)
+            if _gate_cost(fused) <= _gate_cost(previous) + _gate_cost(matrix):
+                program[index] = ['unitary', pair, [fused]]
+                continue
+        program.append(['unitary', pair, [_clean(matrix)]])
+        last_op[pair[0]] = last_op[pair[1]] = len(program) - 1
+
+    for qubit in list(pending):
+        flush(qubit)
+    fused_circuit = Circuit(circuit.num_qubits)
+    fused_circuit.gates = [(name, tuple(qubits), tuple(params)) for name, qubits, params in program]
+    return fused_circuit
+
+def compile_circuit(circuit):
+    # fuse_gates() with an LRU cache keyed by gate names, qubits and parameters, so
+    # simulating the same circuit again skips compilation
+    key = _structure_key(circuit)
+    compiled = _compile_cache.get(key)
+    if compiled is not None:
+        _compile_cache.move_to_end(key)
+        return compiled
+    compiled = fuse_gates(circuit)
+    _compile_cache[key] = compiled
+    if len(_compile_cache) > COMPILE_CACHE_SIZE:
+        _compile_cache.popitem(last=False)
+    return compiled
+
+def clear_compile_cache():
+    _compile_cache.clear()
+
+def fusion_report(circuit):
+    compiled = compile_circuit(circuit)
+    return {'gates_before': len(circuit.gates), 'gates_after': len(compiled.gates),
+            'cost_before': sum(_gate_cost(np.asarray(gate_matrix(name, params))) for name, qubits, params
+                               in circuit.gates if not any(isinstance(param, Parameter) for param in params)),
+            'cost_after': sum(_gate_cost(np.asarray(params[0])) for name, qubits, params
+                              in compiled.gates if name == 'unitary')}
+
+def initial_state(num_qubits, dtype=np.complex128):
+    state = np.zeros(1 << num_qubits, dtype=dtype)
+    state[0] = 1
+    return state
+
+def simulate(circuit, dtype=np.complex128, state=None, fuse=True):
+    # Runs `circuit` (a Circuit or a qiskit QuantumCircuit) from |0...0> or `state`
+    if not isinstance(circuit, Circuit):
+        circuit = Circuit.from_qiskit(circuit)
+    if fuse:
+        circuit = compile_circuit(circuit)
+    num_qubits = circuit.num_qubits
+    if state is None:
+        state = initial_state(num_qubits, dtype)
+    if circuit.parameters:
+        raise ValueError(f"Circuit has unbound parameters {circuit.parameters}; use bind() or parameter_sweep()")
+    for name, qubits, params in circuit.gates:
+        matrix = np.asarray(gate_matrix(name, params), dtype=state.dtype)
+        apply_gate(state, num_qubits, matrix, qubits)
+    return state
+
+def simulate_batch(circuit, parameter_values, dtype=np.complex128, out=None, fuse=True):
+    # Simulates every row of `parameter_values` (columns ordered like circuit.parameters)
+    # as one stacked (batch, 2^n) tensor. Unparameterized gates are applied to the
+    # whole stack at once, parameterized ones with a (batch, d, d) matrix stack.
+    values = np.atleast_2d(np.asarray(parameter_values, dtype=np.float64))
+    parameters = circuit.parameters
+    if values.shape[1] != len(parameters):
+        raise ValueError(f"Expected {len(parameters)} parameter columns, got {values.shape[1]}")
+    columns = {param: column for column, param in enumerate(parameters)}
+    num_qubits = circuit.num_qubits
+    if fuse:
+        circuit = compile_circuit(circuit)
+
+    states = out if out is not None else np.empty((len(values), 1 << num_qubits), dtype=dtype)
+    states[...] = 0
+    states[:, 0] = 1
+    for name, qubits, params in circuit.gates:
+        if any(isinstance(param, Parameter) for param in params):
+            params = [values[:, columns[param]] if isinstance(param, Parameter) else param for param in params]
+        matrix = np.asarray(gate_matrix(name, params), dtype=states.dtype)
+        apply_gate(states, num_qubits, matrix, qubits)
+    return states
+
+def parameter_sweep(circuit, parameter_values, processes=None, batch_size=None, dtype=np.complex128):
+    # Returns a (rows, 2^n) array with the statevector for every parameter row. Rows are
+    # simulated in stacked batches of at most batch_size, optionally spread over a
+    # process pool; the circuit must then be picklable (no lambdas in unitary params).
+    values = np.atleast_2d(np.asarray(parameter_values, dtype=np.float64))
+    num_rows = len(values)
+    if batch_size is None:
+        batch_size = max(1, SWEEP_BATCH_AMPLITUDES >> circuit.num_qubits)
+        if processes and processes > 1:
+            batch_size = min(batch_size, -(-num_rows // processes))
+    chunks = [slice(start, start + batch_size) for start in range(0, num_rows, batch_size)]
+
+    result = np.empty((num_rows, 1 << circuit.num_qubits), dtype=dtype)
+    if processes and processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            batches = pool.map(simulate_batch, repeat(circuit), (values[chunk] for chunk in chunks), repeat(dtype))
+            for chunk, states in zip(chunks, batches):
+                result[chunk] = states
+    else:
+        for chunk in chunks:
+            simulate_batch(circuit, values[chunk], dtype, out=result[chunk])
+    return result